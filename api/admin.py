@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Origin, CoffeeBean, UserRecord, Achievement, UserAchievement, OCRCache
+from .models import User, Origin, CoffeeBean, UserRecord, Achievement, UserAchievement, UserAchievementProgress, AchievementStats, AchievementUserCount, UserStats, OCRCache, OCRJob
+from .services.achievement_stats import AchievementStatsService
 
 
 @admin.register(User)
@@ -51,11 +52,54 @@ class UserAchievementAdmin(admin.ModelAdmin):
     date_hierarchy = 'unlocked_at'
 
 
+@admin.register(AchievementStats)
+class AchievementStatsAdmin(admin.ModelAdmin):
+    list_display = ['achievement', 'unlocked_count', 'unlocked_percent', 'refreshed_at']
+    readonly_fields = ['unlocked_count', 'refreshed_at']
+    
+    @admin.display(description='解锁比例(%)')
+    def unlocked_percent(self, obj):
+        return obj.unlocked_percent(AchievementStatsService.user_count())
+
+
+@admin.register(AchievementUserCount)
+class AchievementUserCountAdmin(admin.ModelAdmin):
+    list_display = ['user_count', 'refreshed_at']
+    readonly_fields = ['user_count', 'refreshed_at']
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'total_records', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = [
+        'total_records', 'coffee_counts', 'origin_counts',
+        'variety_counts', 'process_counts', 'flavor_counts', 'tasted_flavor_counts',
+        'altitude_counts', 'rating_counts', 'ocr_records', 'updated_at'
+    ]
+
+
+@admin.register(UserAchievementProgress)
+class UserAchievementProgressAdmin(admin.ModelAdmin):
+    list_display = ['user', 'achievement', 'current', 'target', 'updated_at']
+    list_filter = ['achievement']
+    search_fields = ['user__username', 'achievement__name']
+    readonly_fields = ['current', 'target', 'updated_at']
+
+
 @admin.register(OCRCache)
 class OCRCacheAdmin(admin.ModelAdmin):
-    list_display = ['image_hash_short', 'matched_coffee', 'confidence', 'created_at']
-    readonly_fields = ['image_hash', 'recognized_text']
+    list_display = ['image_hash_short', 'matched_coffee', 'confidence', 'expires_at', 'created_at']
+    readonly_fields = ['image_hash', 'perceptual_hash', 'recognized_text']
     
     def image_hash_short(self, obj):
         return obj.image_hash[:16] + '...'
     image_hash_short.short_description = '图片哈希'
+
+
+@admin.register(OCRJob)
+class OCRJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username']
+    readonly_fields = ['result', 'error']
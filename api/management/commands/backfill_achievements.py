@@ -0,0 +1,116 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from api.models import Achievement
+from api.services.achievement_backfill import AchievementBackfillService
+from api.services.achievement_rules import get_rule
+
+
+def _init_worker():
+    # spawn 方式启动的子进程需要重新初始化 Django；fork 方式则不能复用父进程的数据库连接
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Re-evaluate achievements for all users in parallel, resumable via a checkpoint file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--achievement', type=int, action='append', dest='achievement_ids',
+                            help='只回填这些成就，可重复，默认全部启用的成就')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='每批用户的 id 区间大小')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='进程数，默认 CPU 核数（SQLite 只允许单个写入者，默认 1）')
+        parser.add_argument('--checkpoint', default='backfill_achievements.checkpoint.json',
+                            help='记录已完成批次的文件，中断后再次运行时跳过这些批次，全部完成后删除')
+        parser.add_argument('--restart', action='store_true', help='忽略已有的检查点从头开始')
+
+    def load_checkpoint(self, path, chunk_size, achievement_ids, restart):
+        if restart or not os.path.exists(path):
+            return set()
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('chunk_size') != chunk_size or state.get('achievements') != achievement_ids:
+            self.stdout.write(self.style.WARNING('Checkpoint was written with different options, starting over'))
+            return set()
+        return set(state.get('done', []))
+
+    def save_checkpoint(self, path, chunk_size, achievement_ids, done):
+        with open(path, 'w') as f:
+            json.dump({'chunk_size': chunk_size, 'achievements': achievement_ids, 'done': sorted(done)}, f)
+
+    def handle(self, *args, **options):
+        achievements = Achievement.objects.filter(is_active=True)
+        if options['achievement_ids']:
+            achievements = achievements.filter(id__in=options['achievement_ids'])
+        achievement_ids = sorted(a.id for a in achievements if get_rule(a.condition) is not None)
+        if not achievement_ids:
+            self.stdout.write('No achievements to backfill')
+            return
+
+        chunk_size = options['chunk_size']
+        path = options['checkpoint']
+        done = self.load_checkpoint(path, chunk_size, achievement_ids, options['restart'])
+        chunks = [chunk for chunk in AchievementBackfillService.chunks(chunk_size) if chunk[0] not in done]
+        if done:
+            self.stdout.write(f'Resuming, {len(done)} chunks already done')
+
+        workers = options['workers']
+        if workers is None:
+            workers = 1 if connection.vendor == 'sqlite' else os.cpu_count() or 1
+
+        started = time.monotonic()
+        total_users = total_unlocked = failed = 0
+
+        def finished(chunk, users, unlocked):
+            nonlocal total_users, total_unlocked
+            total_users += users
+            total_unlocked += unlocked
+            done.add(chunk[0])
+            self.save_checkpoint(path, chunk_size, achievement_ids, done)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'users {chunk[0]}-{chunk[1] - 1}: {users} users, {unlocked} unlocked '
+                f'({total_users / elapsed:.0f} users/s)'
+            )
+
+        if workers <= 1:
+            for chunk in chunks:
+                users, unlocked = AchievementBackfillService.run_chunk(*chunk, achievement_ids)
+                finished(chunk, users, unlocked)
+        else:
+            # 子进程各自建立数据库连接
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                futures = {
+                    executor.submit(AchievementBackfillService.run_chunk, *chunk, achievement_ids): chunk
+                    for chunk in chunks
+                }
+                for future in as_completed(futures):
+                    chunk = futures[future]
+                    try:
+                        users, unlocked = future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f'users {chunk[0]}-{chunk[1] - 1} failed: {e}')
+                        continue
+                    finished(chunk, users, unlocked)
+
+        elapsed = time.monotonic() - started
+        summary = (
+            f'Backfilled {len(achievement_ids)} achievements for {total_users} users in {elapsed:.1f}s '
+            f'({total_users / max(elapsed, 1e-6):.0f} users/s), {total_unlocked} unlocked'
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{summary}; {failed} chunks failed, rerun to resume'))
+            return
+
+        if os.path.exists(path):
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from api.models import User
+from api.services.achievement_progress import AchievementProgressService
+from api.services.user_stats import UserStatsService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized user stats and achievement progress from user records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='只重建这些用户，默认全部')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+        
+        count = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            stats = UserStatsService.rebuild(user_id)
+            AchievementProgressService.update(user_id, stats)
+            count += 1
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} users'))
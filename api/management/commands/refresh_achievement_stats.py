@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.services.achievement_stats import AchievementStatsService
+
+
+class Command(BaseCommand):
+    help = 'Recompute achievement unlock counts and percentages, meant to run periodically (e.g. from cron)'
+
+    def handle(self, *args, **options):
+        count = AchievementStatsService.refresh()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed stats for {count} achievements'))
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_userrecord_unique_together_userrecord_acidity_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='origin',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='更新时间'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_origin_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrcache',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=16, verbose_name='感知哈希'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_ocrcache_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrcache',
+            name='catalog_version',
+            field=models.CharField(blank=True, max_length=100, verbose_name='目录版本'),
+        ),
+        migrations.AddField(
+            model_name='ocrcache',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='过期时间'),
+        ),
+        migrations.AddField(
+            model_name='ocrcache',
+            name='keywords',
+            field=models.JSONField(blank=True, default=list, verbose_name='关键词'),
+        ),
+        migrations.AddField(
+            model_name='ocrcache',
+            name='ocr_confidence',
+            field=models.FloatField(default=0, verbose_name='OCR置信度'),
+        ),
+        migrations.AddField(
+            model_name='ocrcache',
+            name='results',
+            field=models.JSONField(blank=True, default=list, verbose_name='匹配结果'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_ocrcache_full_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '识别中'), ('succeeded', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='识别结果')),
+                ('error', models.TextField(blank=True, verbose_name='错误信息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocr_jobs', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': 'OCR任务',
+                'verbose_name_plural': 'OCR任务',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+import re
+
+from django.db import OperationalError, migrations, models
+
+# 以下为迁移编写时 api.services.fulltext 的副本，之后修改服务代码不影响本迁移
+GIN_INDEX_NAME = 'api_coffeebean_search_gin'
+FTS_TABLE = 'api_coffeebean_fts'
+FTS_CONFIG = 'simple'
+
+CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile(rf'[{CJK}]|[^\W_{CJK}]+')
+
+
+def build_document(name, origin_name, region, variety, flavor_notes):
+    parts = [name, origin_name, region, variety] + [str(flavor) for flavor in flavor_notes or []]
+    return ' '.join(token for part in parts for token in TOKEN_RE.findall((part or '').lower()))
+
+
+def gin_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector('search_document', config=FTS_CONFIG), name=GIN_INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    """填充检索文本，并按数据库建立 GIN 索引或 FTS5 影子表"""
+    CoffeeBean = apps.get_model('api', 'CoffeeBean')
+    beans = list(CoffeeBean.objects.select_related('origin'))
+    for bean in beans:
+        bean.search_document = build_document(
+            bean.name, bean.origin.name, bean.region, bean.variety, bean.flavor_notes
+        )
+    CoffeeBean.objects.bulk_update(beans, ['search_document'])
+
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.add_index(CoffeeBean, gin_index())
+    elif connection.vendor == 'sqlite':
+        table = FTS_TABLE
+        try:
+            schema_editor.execute(f'CREATE VIRTUAL TABLE {table} USING fts5(search_document)')
+        except OperationalError as e:
+            # SQLite 未编译 FTS5 时搜索退回 icontains
+            print(f"FTS5 Error: {e}")
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, search_document) VALUES (%s, %s)',
+                [(bean.pk, bean.search_document) for bean in beans],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('api', 'CoffeeBean'), gin_index())
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_ocrjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coffeebean',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, verbose_name='检索文本'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
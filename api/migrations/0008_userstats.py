@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_coffeebean_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats_snapshot', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+                ('total_records', models.IntegerField(default=0, verbose_name='记录数')),
+                ('coffee_counts', models.JSONField(default=dict, verbose_name='咖啡豆记录数')),
+                ('origin_counts', models.JSONField(default=dict, verbose_name='产地记录数')),
+                ('variety_counts', models.JSONField(default=dict, verbose_name='品种记录数')),
+                ('process_counts', models.JSONField(default=dict, verbose_name='处理法记录数')),
+                ('flavor_counts', models.JSONField(default=dict, verbose_name='风味标签计数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '用户统计',
+                'verbose_name_plural': '用户统计',
+            },
+        ),
+    ]
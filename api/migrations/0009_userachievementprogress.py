@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def clear_user_stats(apps, schema_editor):
+    """已有快照缺少新增的计数，清空后读取时惰性重建"""
+    apps.get_model('api', 'UserStats').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='altitude_counts',
+            field=models.JSONField(default=dict, verbose_name='海拔记录数'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='ocr_records',
+            field=models.IntegerField(default=0, verbose_name='OCR 识别记录数'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='rating_counts',
+            field=models.JSONField(default=dict, verbose_name='评分记录数'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='tasted_flavor_counts',
+            field=models.JSONField(default=dict, verbose_name='品尝过的风味计数'),
+        ),
+        migrations.CreateModel(
+            name='UserAchievementProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current', models.IntegerField(default=0, verbose_name='当前值')),
+                ('target', models.IntegerField(default=1, verbose_name='目标值')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('achievement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_progress', to='api.achievement', verbose_name='成就')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievement_progress', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '成就进度',
+                'verbose_name_plural': '成就进度',
+                'unique_together': {('user', 'achievement')},
+            },
+        ),
+        migrations.RunPython(clear_user_stats, migrations.RunPython.noop),
+    ]
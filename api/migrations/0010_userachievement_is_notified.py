@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+
+def mark_existing_notified(apps, schema_editor):
+    """已有成就都已在创建记录的响应中返回过"""
+    apps.get_model('api', 'UserAchievement').objects.update(is_notified=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_userachievementprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userachievement',
+            name='is_notified',
+            field=models.BooleanField(default=False, verbose_name='已通知'),
+        ),
+        migrations.RunPython(mark_existing_notified, migrations.RunPython.noop),
+    ]
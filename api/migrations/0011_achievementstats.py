@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def populate_achievement_stats(apps, schema_editor):
+    Achievement = apps.get_model('api', 'Achievement')
+    AchievementStats = apps.get_model('api', 'AchievementStats')
+    UserAchievement = apps.get_model('api', 'UserAchievement')
+    User = apps.get_model('api', 'User')
+
+    counts = dict(
+        UserAchievement.objects.order_by().values_list('achievement_id').annotate(n=models.Count('id'))
+    )
+    user_count = User.objects.count()
+    now = timezone.now()
+    AchievementStats.objects.bulk_create([
+        AchievementStats(
+            achievement_id=achievement_id, unlocked_count=counts.get(achievement_id, 0),
+            user_count=user_count, refreshed_at=now,
+        )
+        for achievement_id in Achievement.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_userachievement_is_notified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AchievementStats',
+            fields=[
+                ('achievement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.achievement', verbose_name='成就')),
+                ('unlocked_count', models.IntegerField(default=0, verbose_name='解锁人数')),
+                ('user_count', models.IntegerField(default=0, verbose_name='用户总数')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True, verbose_name='重算时间')),
+            ],
+            options={
+                'verbose_name': '成就统计',
+                'verbose_name_plural': '成就统计',
+            },
+        ),
+        migrations.RunPython(populate_achievement_stats, migrations.RunPython.noop),
+    ]
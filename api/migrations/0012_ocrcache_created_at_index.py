@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_achievementstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ocrcache',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间'),
+        ),
+    ]
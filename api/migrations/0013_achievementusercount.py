@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:27
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_user_count(apps, schema_editor):
+    AchievementUserCount = apps.get_model('api', 'AchievementUserCount')
+    User = apps.get_model('api', 'User')
+    AchievementUserCount.objects.create(pk=1, user_count=User.objects.count(), refreshed_at=timezone.now())
+
+
+def restore_user_count(apps, schema_editor):
+    AchievementStats = apps.get_model('api', 'AchievementStats')
+    AchievementUserCount = apps.get_model('api', 'AchievementUserCount')
+    total = AchievementUserCount.objects.filter(pk=1).first()
+    AchievementStats.objects.update(user_count=total.user_count if total else 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_ocrcache_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AchievementUserCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_count', models.IntegerField(default=0, verbose_name='用户总数')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True, verbose_name='重算时间')),
+            ],
+            options={
+                'verbose_name': '成就统计用户总数',
+                'verbose_name_plural': '成就统计用户总数',
+            },
+        ),
+        migrations.RunPython(populate_user_count, restore_user_count),
+        migrations.RemoveField(
+            model_name='achievementstats',
+            name='user_count',
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 import json
+import uuid
 
 
 class User(AbstractUser):
@@ -20,6 +21,37 @@ class User(AbstractUser):
         return self.nickname or self.username
 
 
+class OriginQuerySet(models.QuerySet):
+    def with_stats(self, user=None):
+        """
+        一次分组查询附加产地统计
+        total_coffees: 在售咖啡豆数；discovered_count: 用户记录过的咖啡豆数；
+        is_unlocked: 用户是否记录过该产地的咖啡豆
+        """
+        queryset = self.annotate(
+            total_coffees=models.Count(
+                'coffee_beans', filter=models.Q(coffee_beans__is_active=True), distinct=True
+            )
+        )
+        if user is None or not user.is_authenticated:
+            return queryset.annotate(
+                discovered_count=models.Value(0),
+                is_unlocked=models.Value(False),
+            )
+        # 用户条件放在 JOIN 的 ON 子句中，只连接当前用户的记录
+        return queryset.annotate(
+            user_records=models.FilteredRelation(
+                'coffee_beans__user_records',
+                condition=models.Q(coffee_beans__user_records__user=user),
+            ),
+        ).annotate(
+            discovered_count=models.Count('user_records__coffee_bean', distinct=True),
+            is_unlocked=models.ExpressionWrapper(
+                models.Q(discovered_count__gt=0), output_field=models.BooleanField()
+            ),
+        )
+
+
 class Origin(models.Model):
     """咖啡产地"""
     name = models.CharField(max_length=100, unique=True, verbose_name='产地名称')
@@ -34,6 +66,9 @@ class Origin(models.Model):
     video_url = models.URLField(blank=True, verbose_name='视频URL')
     is_active = models.BooleanField(default=True, verbose_name='是否激活')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    
+    objects = OriginQuerySet.as_manager()
     
     class Meta:
         verbose_name = '产地'
@@ -80,6 +115,8 @@ class CoffeeBean(models.Model):
     source_url = models.URLField(blank=True, verbose_name='来源链接')
     
     is_active = models.BooleanField(default=True, verbose_name='是否激活')
+    # 全文检索文本，保存时由 signals 生成
+    search_document = models.TextField(blank=True, editable=False, verbose_name='检索文本')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
     
@@ -210,6 +247,15 @@ class UserRecord(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.coffee_bean.name}"
     
+    def save(self, *args, **kwargs):
+        # 与 signals 中的 UserStats 增量更新在同一事务内提交
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
     def get_flavor_profile(self):
         """获取风味轮廓数据,用于雷达图"""
         return {
@@ -222,6 +268,26 @@ class UserRecord(models.Model):
         }
 
 
+class AchievementQuerySet(models.QuerySet):
+    def with_progress(self, user):
+        """
+        一次查询附加用户的成就进度和解锁时间
+        按 (user, achievement) 唯一索引左连接 UserAchievementProgress 和 UserAchievement
+        """
+        return self.annotate(
+            user_progress_row=models.FilteredRelation(
+                'user_progress', condition=models.Q(user_progress__user=user)
+            ),
+            user_unlock_row=models.FilteredRelation(
+                'user_achievements', condition=models.Q(user_achievements__user=user)
+            ),
+        ).annotate(
+            progress_current=models.F('user_progress_row__current'),
+            progress_target=models.F('user_progress_row__target'),
+            unlocked_at=models.F('user_unlock_row__unlocked_at'),
+        )
+
+
 class Achievement(models.Model):
     """成就"""
     RARITY_CHOICES = [
@@ -254,6 +320,8 @@ class Achievement(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='是否激活')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     
+    objects = AchievementQuerySet.as_manager()
+    
     class Meta:
         verbose_name = '成就'
         verbose_name_plural = '成就'
@@ -268,6 +336,8 @@ class UserAchievement(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievements', verbose_name='用户')
     achievement = models.ForeignKey(Achievement, on_delete=models.CASCADE, related_name='user_achievements', verbose_name='成就')
     unlocked_at = models.DateTimeField(auto_now_add=True, verbose_name='解锁时间')
+    # 后台检查解锁的成就在用户下次请求时通知
+    is_notified = models.BooleanField(default=False, verbose_name='已通知')
     
     class Meta:
         verbose_name = '用户成就'
@@ -279,9 +349,98 @@ class UserAchievement(models.Model):
         return f"{self.user.username} - {self.achievement.name}"
 
 
+class AchievementStats(models.Model):
+    """
+    成就稀有度统计
+    解锁时按增量累加，比例的分母取 AchievementUserCount；
+    refresh_achievement_stats 命令定期整体重算，纠正并发等造成的偏差
+    """
+    achievement = models.OneToOneField(Achievement, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name='成就')
+    unlocked_count = models.IntegerField(default=0, verbose_name='解锁人数')
+    refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name='重算时间')
+    
+    class Meta:
+        verbose_name = '成就统计'
+        verbose_name_plural = '成就统计'
+    
+    def __str__(self):
+        return f"{self.achievement.name} - {self.unlocked_count}"
+    
+    def unlocked_percent(self, user_count):
+        """解锁用户占比（%），保留一位小数"""
+        if not user_count:
+            return 0.0
+        return round(min(self.unlocked_count, user_count) * 100 / user_count, 1)
+
+
+class AchievementUserCount(models.Model):
+    """
+    成就解锁比例的分母：用户总数
+    全表只有一行，用户注册、注销时增减，refresh_achievement_stats 命令重算
+    """
+    user_count = models.IntegerField(default=0, verbose_name='用户总数')
+    refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name='重算时间')
+    
+    class Meta:
+        verbose_name = '成就统计用户总数'
+        verbose_name_plural = '成就统计用户总数'
+    
+    def __str__(self):
+        return f"{self.user_count} users"
+
+
+class UserStats(models.Model):
+    """
+    用户统计快照
+    随用户记录的增删改增量维护，各维度为 {值: 记录数} 计数；
+    咖啡目录修改后可用 rebuild_user_stats 命令重算
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats_snapshot', verbose_name='用户')
+    total_records = models.IntegerField(default=0, verbose_name='记录数')
+    coffee_counts = models.JSONField(default=dict, verbose_name='咖啡豆记录数')
+    origin_counts = models.JSONField(default=dict, verbose_name='产地记录数')
+    variety_counts = models.JSONField(default=dict, verbose_name='品种记录数')
+    process_counts = models.JSONField(default=dict, verbose_name='处理法记录数')
+    # 只统计评分 4 分及以上的记录
+    flavor_counts = models.JSONField(default=dict, verbose_name='风味标签计数')
+    tasted_flavor_counts = models.JSONField(default=dict, verbose_name='品尝过的风味计数')
+    altitude_counts = models.JSONField(default=dict, verbose_name='海拔记录数')
+    rating_counts = models.JSONField(default=dict, verbose_name='评分记录数')
+    ocr_records = models.IntegerField(default=0, verbose_name='OCR 识别记录数')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    
+    class Meta:
+        verbose_name = '用户统计'
+        verbose_name_plural = '用户统计'
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.total_records}"
+
+
+class UserAchievementProgress(models.Model):
+    """
+    用户成就进度
+    由 UserStats 中的计数算出，随用户记录的增删改只更新受影响的成就
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievement_progress', verbose_name='用户')
+    achievement = models.ForeignKey(Achievement, on_delete=models.CASCADE, related_name='user_progress', verbose_name='成就')
+    current = models.IntegerField(default=0, verbose_name='当前值')
+    target = models.IntegerField(default=1, verbose_name='目标值')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    
+    class Meta:
+        verbose_name = '成就进度'
+        verbose_name_plural = '成就进度'
+        unique_together = ['user', 'achievement']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.achievement.name} {self.current}/{self.target}"
+
+
 class OCRCache(models.Model):
     """OCR 识别缓存"""
     image_hash = models.CharField(max_length=64, unique=True, verbose_name='图片哈希')
+    perceptual_hash = models.CharField(max_length=16, blank=True, db_index=True, verbose_name='感知哈希')
     recognized_text = models.TextField(verbose_name='识别文本')
     matched_coffee = models.ForeignKey(
         CoffeeBean,
@@ -290,7 +449,13 @@ class OCRCache(models.Model):
         verbose_name='匹配的咖啡'
     )
     confidence = models.FloatField(default=0, verbose_name='置信度')
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    ocr_confidence = models.FloatField(default=0, verbose_name='OCR置信度')
+    keywords = models.JSONField(default=list, blank=True, verbose_name='关键词')
+    # 完整的匹配结果: [{"coffee_id", "score", "confidence", "matched_keywords"}]
+    results = models.JSONField(default=list, blank=True, verbose_name='匹配结果')
+    catalog_version = models.CharField(max_length=100, blank=True, verbose_name='目录版本')
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='过期时间')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='创建时间')
     
     class Meta:
         verbose_name = 'OCR缓存'
@@ -300,6 +465,37 @@ class OCRCache(models.Model):
         return f"OCR Cache {self.image_hash[:16]}..."
 
 
+class OCRJob(models.Model):
+    """异步 OCR 识别任务"""
+    STATUS_CHOICES = [
+        ('pending', '排队中'),
+        ('running', '识别中'),
+        ('succeeded', '已完成'),
+        ('failed', '失败'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ocr_jobs', verbose_name='用户')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='状态')
+    # 识别结果: {"text", "keywords", "results": [{"coffee_id", ...}], "ocr_confidence", "from_cache"}
+    result = models.JSONField(null=True, blank=True, verbose_name='识别结果')
+    error = models.TextField(blank=True, verbose_name='错误信息')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
+    
+    class Meta:
+        verbose_name = 'OCR任务'
+        verbose_name_plural = 'OCR任务'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"OCR Job {self.id} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+
 class UserCoffeeInventory(models.Model):
     """用户咖啡豆库存管理"""
     STATUS_CHOICES = [
@@ -1,12 +1,56 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from .models import Origin, CoffeeBean, UserRecord, Achievement, UserAchievement, UserCoffeeInventory
+from .services.achievement_stats import AchievementStatsService
 
 User = get_user_model()
 
 
+def get_discovered_bean_ids(context):
+    """
+    当前用户记录过的咖啡豆 id 集合
+    每个请求只查询一次，缓存在序列化器 context 中，嵌套和 many=True 的序列化器共用
+    """
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return set()
+    if 'discovered_bean_ids' not in context:
+        context['discovered_bean_ids'] = set(
+            UserRecord.objects.filter(user=request.user).order_by()
+            .values_list('coffee_bean_id', flat=True).distinct()
+        )
+    return context['discovered_bean_ids']
+
+
+def get_unlocked_achievements(context):
+    """
+    当前用户已解锁成就的 {achievement_id: unlocked_at}
+    与 get_discovered_bean_ids 一样每个请求只查询一次，缓存在 context 中
+    """
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return {}
+    if 'unlocked_achievements' not in context:
+        context['unlocked_achievements'] = dict(
+            UserAchievement.objects.filter(user=request.user).values_list('achievement_id', 'unlocked_at')
+        )
+    return context['unlocked_achievements']
+
+
+def get_achievement_user_count(context):
+    """成就解锁比例的分母，每个请求只查询一次，缓存在 context 中"""
+    if 'achievement_user_count' not in context:
+        context['achievement_user_count'] = AchievementStatsService.user_count()
+    return context['achievement_user_count']
+
+
 class UserSerializer(serializers.ModelSerializer):
-    """用户序列化器"""
+    """
+    用户序列化器
+    stats 需要多次聚合查询，只在请求带 ?include=stats 时返回；
+    注册、登录等不带 request 的场景不计算
+    """
     stats = serializers.SerializerMethodField()
     
     class Meta:
@@ -14,6 +58,13 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'nickname', 'email', 'avatar', 'bio', 'created_at', 'stats']
         read_only_fields = ['id', 'created_at']
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        include = getattr(request, 'query_params', {}).get('include', '')
+        if 'stats' not in include.split(','):
+            self.fields.pop('stats')
+    
     def get_stats(self, obj):
         """获取用户统计"""
         from .services.achievement_service import AchievementService
@@ -56,26 +107,28 @@ class OriginSerializer(serializers.ModelSerializer):
             'is_unlocked', 'discovered_count', 'total_coffees'
         ]
     
+    def get_stats(self, obj):
+        """
+        读取 Origin.objects.with_stats() 附加的统计；
+        未附加时（如嵌套在咖啡豆详情中）单独查询一次并缓存在对象上
+        """
+        if not hasattr(obj, 'total_coffees'):
+            request = self.context.get('request')
+            stats = Origin.objects.with_stats(request.user if request else None).values(
+                'total_coffees', 'discovered_count', 'is_unlocked'
+            ).get(pk=obj.pk)
+            for key, value in stats.items():
+                setattr(obj, key, value)
+        return obj
+    
     def get_is_unlocked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserRecord.objects.filter(
-                user=request.user,
-                coffee_bean__origin=obj
-            ).exists()
-        return False
+        return bool(self.get_stats(obj).is_unlocked)
     
     def get_discovered_count(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserRecord.objects.filter(
-                user=request.user,
-                coffee_bean__origin=obj
-            ).values('coffee_bean').distinct().count()
-        return 0
+        return self.get_stats(obj).discovered_count
     
     def get_total_coffees(self, obj):
-        return obj.coffee_beans.filter(is_active=True).count()
+        return self.get_stats(obj).total_coffees
 
 
 class CoffeeBeanListSerializer(serializers.ModelSerializer):
@@ -92,13 +145,7 @@ class CoffeeBeanListSerializer(serializers.ModelSerializer):
         ]
     
     def get_is_discovered(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserRecord.objects.filter(
-                user=request.user,
-                coffee_bean=obj
-            ).exists()
-        return False
+        return obj.id in get_discovered_bean_ids(self.context)
 
 
 class CoffeeBeanDetailSerializer(serializers.ModelSerializer):
@@ -118,13 +165,7 @@ class CoffeeBeanDetailSerializer(serializers.ModelSerializer):
         ]
     
     def get_is_discovered(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserRecord.objects.filter(
-                user=request.user,
-                coffee_bean=obj
-            ).exists()
-        return False
+        return obj.id in get_discovered_bean_ids(self.context)
 
 
 class UserRecordSerializer(serializers.ModelSerializer):
@@ -206,37 +247,64 @@ class UserRecordCreateSerializer(serializers.ModelSerializer):
 
 
 class AchievementSerializer(serializers.ModelSerializer):
-    """成就序列化器"""
+    """
+    成就序列化器
+    解锁人数读取物化的 AchievementStats，查询集需 select_related('stats')；
+    比例的分母为 AchievementUserCount 中的用户总数
+    """
     is_unlocked = serializers.SerializerMethodField()
     unlocked_at = serializers.SerializerMethodField()
+    unlocked_count = serializers.SerializerMethodField()
+    unlocked_percent = serializers.SerializerMethodField()
     
     class Meta:
         model = Achievement
         fields = [
             'id', 'name', 'description', 'icon',
             'category', 'rarity', 'condition',
-            'is_unlocked', 'unlocked_at'
+            'is_unlocked', 'unlocked_at',
+            'unlocked_count', 'unlocked_percent'
         ]
     
     def get_is_unlocked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserAchievement.objects.filter(
-                user=request.user,
-                achievement=obj
-            ).exists()
-        return False
+        return obj.id in get_unlocked_achievements(self.context)
     
     def get_unlocked_at(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            user_achievement = UserAchievement.objects.filter(
-                user=request.user,
-                achievement=obj
-            ).first()
-            if user_achievement:
-                return user_achievement.unlocked_at
-        return None
+        return get_unlocked_achievements(self.context).get(obj.id)
+    
+    def get_unlocked_count(self, obj):
+        stats = getattr(obj, 'stats', None)
+        return stats.unlocked_count if stats else 0
+    
+    def get_unlocked_percent(self, obj):
+        stats = getattr(obj, 'stats', None)
+        return stats.unlocked_percent(get_achievement_user_count(self.context)) if stats else 0.0
+
+
+class AchievementProgressSerializer(serializers.ModelSerializer):
+    """成就进度序列化器，读取 Achievement.objects.with_progress(user) 附加的字段"""
+    current = serializers.IntegerField(source='progress_current', read_only=True)
+    target = serializers.IntegerField(source='progress_target', read_only=True)
+    percent = serializers.SerializerMethodField()
+    is_unlocked = serializers.SerializerMethodField()
+    unlocked_at = serializers.DateTimeField(read_only=True)
+    
+    class Meta:
+        model = Achievement
+        fields = [
+            'id', 'name', 'description', 'icon', 'category', 'rarity',
+            'current', 'target', 'percent', 'is_unlocked', 'unlocked_at'
+        ]
+    
+    def get_is_unlocked(self, obj):
+        return obj.unlocked_at is not None
+    
+    def get_percent(self, obj):
+        if obj.unlocked_at is not None:
+            return 100
+        if not obj.progress_target:
+            return 0
+        return min(100, obj.progress_current * 100 // obj.progress_target)
 
 
 class UserAchievementSerializer(serializers.ModelSerializer):
@@ -260,6 +328,15 @@ class OCRRequestSerializer(serializers.Serializer):
     image = serializers.ImageField(required=True)
 
 
+class OCRBatchRequestSerializer(serializers.Serializer):
+    """批量 OCR 请求序列化器"""
+    images = serializers.ListField(
+        child=serializers.ImageField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'OCR_BATCH_MAX_IMAGES', 10)
+    )
+
+
 class SearchQuerySerializer(serializers.Serializer):
     """搜索请求序列化器"""
     q = serializers.CharField(required=True, min_length=1)
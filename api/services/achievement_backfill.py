@@ -0,0 +1,80 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+from django.db.models import Max, Min
+
+from ..models import Achievement, User, UserAchievement, UserRecord, UserStats
+from .achievement_rules import UserCounters, get_rule
+from .achievement_stats import AchievementStatsService
+from .user_stats import UserStatsService
+
+
+class AchievementBackfillService:
+    """
+    批量回填成就
+    按用户 id 区间分批，每个成就条件对整批用户做一次集合查询（如一次 GROUP BY 找出
+    探索过至少 N 个产地的用户）；无法用集合查询表达的条件基于 UserStats 计数逐个判断
+    """
+
+    @classmethod
+    def chunks(cls, chunk_size: int) -> List[Tuple[int, int]]:
+        """按用户 id 划分的 [start, end) 区间"""
+        bounds = User.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            return []
+        return [
+            (start, start + chunk_size)
+            for start in range(bounds['low'], bounds['high'] + 1, chunk_size)
+        ]
+
+    @classmethod
+    def load_counters(cls, start: int, end: int, user_ids: Iterable[int]) -> Dict[int, UserCounters]:
+        """一次读取区间内用户的统计快照，缺失的逐个重建"""
+        snapshots = {
+            stats.user_id: stats
+            for stats in UserStats.objects.filter(user_id__gte=start, user_id__lt=end)
+        }
+        return {
+            user_id: UserCounters(snapshots.get(user_id) or UserStatsService.rebuild(user_id))
+            for user_id in user_ids
+        }
+
+    @classmethod
+    def run_chunk(cls, start: int, end: int, achievement_ids: List[int]) -> Tuple[int, int]:
+        """回填 id 在 [start, end) 内的用户，返回 (用户数, 新解锁数)"""
+        user_ids: Set[int] = set(
+            User.objects.filter(id__gte=start, id__lt=end).values_list('id', flat=True)
+        )
+        if not user_ids:
+            return 0, 0
+
+        achievements = [
+            achievement for achievement in Achievement.objects.filter(id__in=achievement_ids)
+            if get_rule(achievement.condition) is not None
+        ]
+        unlocked = set(
+            UserAchievement.objects.filter(
+                user_id__gte=start, user_id__lt=end, achievement__in=achievements
+            ).values_list('user_id', 'achievement_id')
+        )
+        records = UserRecord.objects.filter(user_id__gte=start, user_id__lt=end)
+
+        counters = None
+        new_rows = []
+        for achievement in achievements:
+            rule = get_rule(achievement.condition)
+            qualifying = rule.qualifying_users(achievement.condition, records)
+            if qualifying is not None:
+                users = set(qualifying)
+            else:
+                if counters is None:
+                    counters = cls.load_counters(start, end, user_ids)
+                users = {
+                    user_id for user_id, user_counters in counters.items()
+                    if rule.check(achievement.condition, user_counters)
+                }
+            new_rows.extend(
+                UserAchievement(user_id=user_id, achievement=achievement)
+                for user_id in users if (user_id, achievement.id) not in unlocked
+            )
+
+        return len(user_ids), len(AchievementStatsService.unlock(new_rows))
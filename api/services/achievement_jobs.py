@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from ..models import User
+from .achievement_rules import RecordDelta
+from .achievement_service import AchievementService
+
+
+class AchievementJobService:
+    """
+    后台成就检查
+    记录所在事务提交后交给进程内线程池检查成就，新解锁的成就标记为未通知，
+    由用户下次请求或通知接口取回
+    """
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'ACHIEVEMENT_WORKER_THREADS', 2),
+                    thread_name_prefix='achievement-check',
+                )
+            return cls._executor
+
+    @classmethod
+    def submit(cls, user_id: int, delta: Optional[RecordDelta] = None) -> None:
+        """事务提交后再检查，保证工作线程能读到新记录和更新后的用户统计"""
+        transaction.on_commit(lambda: cls.get_executor().submit(cls.run, user_id, delta))
+
+    @classmethod
+    def run(cls, user_id: int, delta: Optional[RecordDelta] = None) -> None:
+        """在工作线程中执行检查"""
+        try:
+            user = User.objects.filter(pk=user_id).first()
+            if user is not None:
+                AchievementService(user).check_achievements(delta)
+        except Exception as e:
+            print(f"Achievement Check Error: {e}")
+        finally:
+            close_old_connections()
@@ -0,0 +1,74 @@
+from typing import List, Optional, Set
+
+from django.utils import timezone
+
+from ..models import Achievement, UserAchievementProgress, UserStats
+from .achievement_rules import UserCounters, get_rule
+from .user_stats import UserStatsService
+
+
+class AchievementProgressService:
+    """
+    用户成就进度的增量维护
+    记录写入后由 UserStats 计数算出依赖维度发生变化的成就进度，批量写回 UserAchievementProgress
+    """
+
+    @classmethod
+    def build(cls, user_id: int, achievements: List[Achievement],
+              stats: UserStats) -> List[UserAchievementProgress]:
+        counters = UserCounters(stats)
+        rows = []
+        for achievement in achievements:
+            rule = get_rule(achievement.condition)
+            if rule is None:
+                continue
+            current, target = rule.progress(achievement.condition, counters)
+            rows.append(UserAchievementProgress(
+                user_id=user_id, achievement=achievement, current=current, target=target
+            ))
+        return rows
+
+    @classmethod
+    def update(cls, user_id: int, stats: UserStats, dimensions: Optional[Set[str]] = None,
+               create: bool = True) -> None:
+        """
+        更新依赖 dimensions 中任一维度的成就进度，dimensions 为 None 时更新全部
+        create 为 False 时只更新已有的进度行（删除记录时用，避免级联删除用户时又写入新行）
+        """
+        achievements = [
+            achievement for achievement in Achievement.objects.filter(is_active=True)
+            if get_rule(achievement.condition) is not None
+            and (dimensions is None or get_rule(achievement.condition).depends_on & dimensions)
+        ]
+        rows = cls.build(user_id, achievements, stats)
+        if not rows:
+            return
+
+        if create:
+            UserAchievementProgress.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['user', 'achievement'],
+                update_fields=['current', 'target', 'updated_at'],
+            )
+            return
+
+        existing = {
+            progress.achievement_id: progress
+            for progress in UserAchievementProgress.objects.filter(
+                user_id=user_id, achievement__in=[row.achievement for row in rows]
+            )
+        }
+        now = timezone.now()
+        changed = []
+        for row in rows:
+            progress = existing.get(row.achievement.id)
+            if progress is not None:
+                progress.current, progress.target, progress.updated_at = row.current, row.target, now
+                changed.append(progress)
+        UserAchievementProgress.objects.bulk_update(changed, ['current', 'target', 'updated_at'])
+
+    @classmethod
+    def sync(cls, user_id: int) -> None:
+        """按 UserStats 重算用户全部成就进度，用于补齐新成就或条件修改后被清空的进度"""
+        cls.update(user_id, UserStatsService.get(user_id))
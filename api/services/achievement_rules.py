@@ -0,0 +1,370 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from django.db.models import Count, Q, QuerySet
+
+from ..models import Achievement, CoffeeBean, UserRecord, UserStats
+
+# 成就条件依赖的维度
+RECORDS = 'records'
+BEANS = 'beans'
+ORIGINS = 'origins'
+VARIETIES = 'varieties'
+PROCESSES = 'processes'
+FLAVORS = 'flavors'
+ALTITUDE = 'altitude'
+RATING = 'rating'
+OCR = 'ocr'
+
+
+BEAN_DIMENSIONS = {BEANS, ORIGINS, VARIETIES, PROCESSES, FLAVORS, ALTITUDE}
+
+
+class UserCounters:
+    """
+    UserStats 快照中增量维护的计数
+    成就条件基于它在内存中判断，不再对用户记录做聚合查询
+    """
+
+    def __init__(self, stats: UserStats):
+        self.record_count = stats.total_records
+        self.ocr_count = stats.ocr_records
+        self.rating_counts = {int(rating): count for rating, count in stats.rating_counts.items()}
+        self.bean_ids = {int(bean_id) for bean_id in stats.coffee_counts}
+        self.origins = set(stats.origin_counts)
+        self.varieties = set(stats.variety_counts)
+        self.processes = set(stats.process_counts)
+        self.flavors = set(stats.tasted_flavor_counts)
+        self.max_altitude = max((int(altitude) for altitude in stats.altitude_counts), default=None)
+
+    def rating_count(self, min_rating: int) -> int:
+        """评分不低于 min_rating 的记录数"""
+        return sum(count for rating, count in self.rating_counts.items() if rating >= min_rating)
+
+
+def record_dimensions(key: tuple) -> Set[str]:
+    """一条记录 (coffee_bean_id, rating, recognized_by_ocr) 计入的全部维度"""
+    dimensions = {RECORDS} | BEAN_DIMENSIONS
+    if key[1] is not None:
+        dimensions.add(RATING)
+    if key[2]:
+        dimensions.add(OCR)
+    return dimensions
+
+
+def changed_dimensions(old: Optional[tuple], new: Optional[tuple]) -> Set[str]:
+    """记录从 old 变为 new 时计数可能增减的维度，用于更新成就进度"""
+    if old is None or new is None:
+        return record_dimensions(old or new)
+    dimensions = set()
+    if old[0] != new[0]:
+        dimensions.update(BEAN_DIMENSIONS)
+    if old[1] != new[1]:
+        dimensions.add(RATING)
+    if old[2] != new[2]:
+        dimensions.add(OCR)
+    return dimensions
+
+
+class RecordDelta:
+    """
+    一次记录写入带来的变化
+    只描述可能让成就条件由不满足变为满足的部分（成就解锁后不会撤销，删除记录无需检查）
+    """
+
+    def __init__(self, record: UserRecord, previous: Optional[tuple] = None):
+        """previous: 修改前的 (coffee_bean_id, rating, recognized_by_ocr)，新建记录时为 None"""
+        self.created = previous is None
+        self.bean: Optional[CoffeeBean] = None
+        self.rating: Optional[int] = None
+        self.ocr = bool(record.recognized_by_ocr)
+
+        self.dimensions: Set[str] = set()
+        if self.created:
+            self.dimensions.add(RECORDS)
+        if self.created or previous[0] != record.coffee_bean_id:
+            self.bean = record.coffee_bean
+            self.dimensions.update(BEAN_DIMENSIONS)
+        if record.rating is not None and (self.created or previous[1] != record.rating):
+            self.rating = record.rating
+            self.dimensions.add(RATING)
+        if self.ocr and (self.created or not previous[2]):
+            self.dimensions.add(OCR)
+
+
+class AchievementRule:
+    """
+    成就条件类型
+    depends_on 声明条件依赖的维度，记录写入时只检查依赖维度发生变化的成就；
+    may_change 可根据写入的具体内容进一步排除不可能满足的成就；
+    progress 返回 (当前值, 目标值)，当前值达到目标值即解锁；
+    qualifying_users 可选，给出一次集合查询找出满足条件用户的方式，供批量回填使用
+    """
+
+    type = ''
+    depends_on: Set[str] = set()
+
+    @staticmethod
+    def targets(condition: Dict) -> List:
+        target = condition.get('target')
+        return target if isinstance(target, list) else [target]
+
+    def may_change(self, condition: Dict, delta: RecordDelta) -> bool:
+        return True
+
+    def progress(self, condition: Dict, counters: UserCounters) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def check(self, condition: Dict, counters: UserCounters) -> bool:
+        current, target = self.progress(condition, counters)
+        return current >= target
+
+    def qualifying_users(self, condition: Dict, records: QuerySet) -> Optional[QuerySet]:
+        """
+        records 为一批用户的 UserRecord 查询集，返回其中满足条件的 user_id 查询集；
+        无法用一次查询表达时返回 None，由调用方基于 UserStats 计数逐个判断
+        """
+        return None
+
+    @staticmethod
+    def users_with_at_least(records: QuerySet, count: Count, target: int) -> QuerySet:
+        """按用户分组，count 不少于 target 的用户"""
+        return records.order_by().values('user_id').annotate(n=count).filter(
+            n__gte=target
+        ).values_list('user_id', flat=True)
+
+    @staticmethod
+    def users_with_any(records: QuerySet) -> QuerySet:
+        """有任一匹配记录的用户"""
+        return records.order_by().values_list('user_id', flat=True).distinct()
+
+
+RULES: Dict[str, AchievementRule] = {}
+
+
+def register_rule(rule_class: Type[AchievementRule]) -> Type[AchievementRule]:
+    """注册成就条件类型，新的条件类型用该装饰器接入"""
+    RULES[rule_class.type] = rule_class()
+    return rule_class
+
+
+def get_rule(condition: Dict) -> Optional[AchievementRule]:
+    return RULES.get((condition or {}).get('type'))
+
+
+@register_rule
+class OriginCountRule(AchievementRule):
+    """探索产地数量"""
+    type = 'origin_count'
+    depends_on = {ORIGINS}
+
+    def progress(self, condition, counters):
+        return len(counters.origins), condition['target']
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_at_least(records, Count('coffee_bean__origin', distinct=True), condition['target'])
+
+
+@register_rule
+class CoffeeCountRule(AchievementRule):
+    """发现咖啡数量"""
+    type = 'coffee_count'
+    depends_on = {BEANS}
+
+    def progress(self, condition, counters):
+        return len(counters.bean_ids), condition['target']
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_at_least(records, Count('coffee_bean', distinct=True), condition['target'])
+
+
+@register_rule
+class VarietyCountRule(AchievementRule):
+    """品尝品种数量"""
+    type = 'variety_count'
+    depends_on = {VARIETIES}
+
+    def progress(self, condition, counters):
+        return len(counters.varieties), condition['target']
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_at_least(records, Count('coffee_bean__variety', distinct=True), condition['target'])
+
+
+@register_rule
+class RecordCountRule(AchievementRule):
+    """记录数量"""
+    type = 'record_count'
+    depends_on = {RECORDS}
+
+    def progress(self, condition, counters):
+        return counters.record_count, condition['target']
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_at_least(records, Count('id'), condition['target'])
+
+
+@register_rule
+class SpecificOriginRule(AchievementRule):
+    """特定产地"""
+    type = 'specific_origin'
+    depends_on = {ORIGINS}
+
+    def may_change(self, condition, delta):
+        return delta.bean.origin.name in self.targets(condition)
+
+    def progress(self, condition, counters):
+        return int(any(origin in counters.origins for origin in self.targets(condition))), 1
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_any(records.filter(coffee_bean__origin__name__in=self.targets(condition)))
+
+
+@register_rule
+class SpecificCoffeeRule(AchievementRule):
+    """特定咖啡"""
+    type = 'specific_coffee'
+    depends_on = {BEANS}
+
+    def may_change(self, condition, delta):
+        return delta.bean.id in self.targets(condition)
+
+    def progress(self, condition, counters):
+        return int(any(coffee_id in counters.bean_ids for coffee_id in self.targets(condition))), 1
+
+    def qualifying_users(self, condition, records):
+        bean_ids = [target for target in self.targets(condition) if isinstance(target, int)]
+        return self.users_with_any(records.filter(coffee_bean_id__in=bean_ids))
+
+
+@register_rule
+class SpecificVarietyRule(AchievementRule):
+    """特定品种，品种名包含目标即可（不区分大小写）"""
+    type = 'specific_variety'
+    depends_on = {VARIETIES}
+
+    @classmethod
+    def matches(cls, condition, variety):
+        return any(str(target).lower() in variety.lower() for target in cls.targets(condition))
+
+    def may_change(self, condition, delta):
+        return self.matches(condition, delta.bean.variety)
+
+    def progress(self, condition, counters):
+        return int(any(self.matches(condition, variety) for variety in counters.varieties)), 1
+
+    def qualifying_users(self, condition, records):
+        query = Q()
+        for target in self.targets(condition):
+            query |= Q(coffee_bean__variety__icontains=str(target))
+        if not query:
+            return None
+        return self.users_with_any(records.filter(query))
+
+
+@register_rule
+class SpecificProcessRule(AchievementRule):
+    """特定处理法"""
+    type = 'specific_process'
+    depends_on = {PROCESSES}
+
+    def may_change(self, condition, delta):
+        return delta.bean.process in self.targets(condition)
+
+    def progress(self, condition, counters):
+        return int(any(process in counters.processes for process in self.targets(condition))), 1
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_any(records.filter(coffee_bean__process__in=self.targets(condition)))
+
+
+@register_rule
+class RatingCountRule(AchievementRule):
+    """评分数量"""
+    type = 'rating_count'
+    depends_on = {RATING}
+
+    def may_change(self, condition, delta):
+        return delta.rating >= condition.get('min_rating', 4)
+
+    def progress(self, condition, counters):
+        return counters.rating_count(condition.get('min_rating', 4)), condition['target']
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_at_least(
+            records.filter(rating__gte=condition.get('min_rating', 4)), Count('id'), condition['target']
+        )
+
+
+@register_rule
+class FlavorExplorerRule(AchievementRule):
+    """风味探索者：目标为数字时表示收集的不同风味数量，为列表时需集齐全部风味"""
+    type = 'flavor_explorer'
+    depends_on = {FLAVORS}
+
+    def may_change(self, condition, delta):
+        if isinstance(condition.get('target'), int):
+            return bool(delta.bean.flavor_notes)
+        return any(tag in (delta.bean.flavor_notes or []) for tag in self.targets(condition))
+
+    def progress(self, condition, counters):
+        target = condition.get('target')
+        if isinstance(target, int):
+            return len(counters.flavors), target
+        targets = self.targets(condition)
+        return sum(tag in counters.flavors for tag in targets), len(targets)
+
+
+@register_rule
+class HighAltitudeRule(AchievementRule):
+    """高海拔猎人"""
+    type = 'high_altitude'
+    depends_on = {ALTITUDE}
+
+    def may_change(self, condition, delta):
+        return delta.bean.altitude_min is not None and delta.bean.altitude_min >= condition['target']
+
+    def progress(self, condition, counters):
+        return counters.max_altitude or 0, condition['target']
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_any(records.filter(coffee_bean__altitude_min__gte=condition['target']))
+
+
+@register_rule
+class OCRMasterRule(AchievementRule):
+    """OCR 大师：使用 OCR 识别的记录数"""
+    type = 'ocr_master'
+    depends_on = {OCR}
+
+    def progress(self, condition, counters):
+        return counters.ocr_count, condition['target']
+
+    def qualifying_users(self, condition, records):
+        return self.users_with_at_least(records.filter(recognized_by_ocr=True), Count('id'), condition['target'])
+
+
+class AchievementIndex:
+    """按依赖维度索引成就，记录写入时只取出可能受影响的成就"""
+
+    def __init__(self, achievements: Iterable[Achievement]):
+        self.achievements = list(achievements)
+        self.by_dimension: Dict[str, List[Achievement]] = defaultdict(list)
+        for achievement in self.achievements:
+            rule = get_rule(achievement.condition)
+            if rule is None:
+                continue
+            for dimension in rule.depends_on:
+                self.by_dimension[dimension].append(achievement)
+
+    def affected(self, delta: RecordDelta) -> List[Achievement]:
+        seen = set()
+        affected = []
+        for dimension in delta.dimensions:
+            for achievement in self.by_dimension.get(dimension, ()):
+                if achievement.id in seen:
+                    continue
+                seen.add(achievement.id)
+                if get_rule(achievement.condition).may_change(achievement.condition, delta):
+                    affected.append(achievement)
+        return affected
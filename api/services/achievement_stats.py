@@ -0,0 +1,127 @@
+from collections import Counter, defaultdict
+from typing import Iterable, List
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from ..models import Achievement, AchievementStats, AchievementUserCount, User, UserAchievement
+
+
+class AchievementStatsService:
+    """成就稀有度统计的增量维护与定期重算"""
+
+    @classmethod
+    def add_unlocks(cls, achievement_ids: Iterable[int], sign: int = 1) -> None:
+        """
+        累加各成就的解锁人数，sign 为 -1 时扣除
+        增量相同的成就合并为一条 UPDATE，通常一次解锁只需一次查询
+        """
+        by_delta = defaultdict(list)
+        for achievement_id, count in Counter(achievement_ids).items():
+            by_delta[count * sign].append(achievement_id)
+        for delta, ids in by_delta.items():
+            AchievementStats.objects.filter(achievement_id__in=ids).update(
+                unlocked_count=F('unlocked_count') + delta
+            )
+
+    @classmethod
+    def unlock(cls, user_achievements: List[UserAchievement]) -> List[UserAchievement]:
+        """
+        写入解锁记录，已存在的（如并发请求先解锁）跳过；
+        返回实际新增的记录，解锁人数只按实际新增累加
+        """
+        if not user_achievements:
+            return []
+        inserted = cls._insert(user_achievements)
+        cls.add_unlocks(user_achievement.achievement_id for user_achievement in inserted)
+        return inserted
+
+    @classmethod
+    def _insert(cls, user_achievements: List[UserAchievement]) -> List[UserAchievement]:
+        """
+        PostgreSQL、SQLite 用 INSERT ... ON CONFLICT DO NOTHING RETURNING 一次写入并取回实际新增的行；
+        其他数据库逐条 get_or_create
+        """
+        if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_rows_from_bulk_insert:
+            qn = connection.ops.quote_name
+            table = qn(UserAchievement._meta.db_table)
+            unlocked_at = connection.ops.adapt_datetimefield_value(timezone.now())
+            by_key = {(ua.user_id, ua.achievement_id): ua for ua in user_achievements}
+            inserted = []
+            try:
+                # 保存点：出错时不影响外层事务，退回到逐条写入
+                with transaction.atomic(), connection.cursor() as cursor:
+                    items = list(by_key.values())
+                    for start in range(0, len(items), 500):
+                        batch = items[start:start + 500]
+                        cursor.execute(
+                            f'INSERT INTO {table} ({qn("user_id")}, {qn("achievement_id")}, '
+                            f'{qn("unlocked_at")}, {qn("is_notified")}) '
+                            f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))} '
+                            f'ON CONFLICT ({qn("user_id")}, {qn("achievement_id")}) DO NOTHING '
+                            f'RETURNING {qn("user_id")}, {qn("achievement_id")}',
+                            [
+                                value for ua in batch
+                                for value in (ua.user_id, ua.achievement_id, unlocked_at, ua.is_notified)
+                            ],
+                        )
+                        inserted.extend(by_key[row] for row in cursor.fetchall())
+                return inserted
+            except DatabaseError as e:
+                print(f"Achievement Unlock Error: {e}")
+
+        inserted = []
+        for ua in user_achievements:
+            _, created = UserAchievement.objects.get_or_create(
+                user_id=ua.user_id, achievement_id=ua.achievement_id,
+                defaults={'is_notified': ua.is_notified},
+            )
+            if created:
+                inserted.append(ua)
+        return inserted
+
+    @classmethod
+    def add_users(cls, delta: int) -> None:
+        """增减用户总数，只更新一行；该行缺失时按当前用户数重建"""
+        updated = AchievementUserCount.objects.filter(pk=1).update(user_count=F('user_count') + delta)
+        if not updated:
+            cls.refresh_user_count()
+
+    @classmethod
+    def user_count(cls) -> int:
+        return AchievementUserCount.objects.filter(pk=1).values_list('user_count', flat=True).first() or 0
+
+    @classmethod
+    def refresh_user_count(cls) -> None:
+        AchievementUserCount.objects.update_or_create(
+            pk=1, defaults={'user_count': User.objects.count(), 'refreshed_at': timezone.now()}
+        )
+
+    @classmethod
+    def create_for(cls, achievement: Achievement) -> None:
+        """新成就的统计行"""
+        AchievementStats.objects.get_or_create(achievement=achievement)
+
+    @classmethod
+    def refresh(cls) -> int:
+        """一次分组查询重算全部成就的解锁人数，并重算用户总数，返回成就数"""
+        counts = dict(
+            UserAchievement.objects.order_by().values_list('achievement_id').annotate(n=Count('id'))
+        )
+        now = timezone.now()
+        rows = [
+            AchievementStats(
+                achievement_id=achievement_id, unlocked_count=counts.get(achievement_id, 0),
+                refreshed_at=now,
+            )
+            for achievement_id in Achievement.objects.values_list('id', flat=True)
+        ]
+        AchievementStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['achievement'],
+            update_fields=['unlocked_count', 'refreshed_at'],
+        )
+        cls.refresh_user_count()
+        return len(rows)
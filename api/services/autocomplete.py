@@ -0,0 +1,241 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count
+
+from ..models import CoffeeBean, Origin, UserRecord
+from .catalog import get_catalog_version
+
+# (类型, 小写文本)，唯一标识一条联想词
+SuggestionKey = Tuple[str, str]
+
+
+class _Node:
+    __slots__ = ('children', 'entries', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        # 以该节点结尾的词条
+        self.entries: set = set()
+        # 子树中排名前 limit 的词条，整体替换而不原地修改，读取时无需加锁
+        self.top: List[int] = []
+
+
+class PrefixTrie:
+    """
+    前缀树，每个节点预存子树内排名前 limit 的词条
+    查询只需沿前缀走到对应节点，复杂度与词库大小无关；
+    增删词条时只重算路径上的节点
+    """
+
+    def __init__(self, rank: Callable[[int], tuple], limit: int):
+        self.root = _Node()
+        self.rank = rank
+        self.limit = limit
+
+    def _path(self, key: str, create: bool) -> Optional[List[_Node]]:
+        nodes = [self.root]
+        for char in key:
+            child = nodes[-1].children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = _Node()
+                nodes[-1].children[char] = child
+            nodes.append(child)
+        return nodes
+
+    def _recompute(self, node: _Node) -> None:
+        candidates = set(node.entries)
+        for child in node.children.values():
+            candidates.update(child.top)
+        node.top = sorted(candidates, key=self.rank)[:self.limit]
+
+    def add(self, key: str, entry: int) -> None:
+        nodes = self._path(key, create=True)
+        nodes[-1].entries.add(entry)
+        for node in nodes:
+            if entry not in node.top:
+                node.top = sorted(node.top + [entry], key=self.rank)[:self.limit]
+
+    def remove(self, key: str, entry: int) -> None:
+        nodes = self._path(key, create=False)
+        if nodes is None:
+            return
+        nodes[-1].entries.discard(entry)
+        for depth in range(len(nodes) - 1, -1, -1):
+            node = nodes[depth]
+            # 剪掉空分支
+            if depth and not node.entries and not node.children:
+                del nodes[depth - 1].children[key[depth - 1]]
+                continue
+            self._recompute(node)
+
+    def top(self, prefix: str) -> List[int]:
+        nodes = self._path(prefix, create=False)
+        return nodes[-1].top if nodes else []
+
+
+class AutocompleteIndex:
+    """
+    咖啡目录输入联想
+    词条来自豆名、产地、产区、品种、处理法及 OCRService 中的中英文别名，
+    按热度（记录过相关咖啡豆的用户数）排序；多词文本的每个词都可作为前缀起点。
+    目录版本变化或热度过期时重新读取词条，只把有变化的词条更新到前缀树
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._loaded_at = 0.0
+        self.limit = getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 10)
+        self.suggestions: Dict[SuggestionKey, Dict] = {}
+        self.entry_ids: Dict[SuggestionKey, int] = {}
+        # 已删除词条的编号不复用（读取时不加锁，旧的 top 列表可能仍引用它们），
+        # 空位超过一半时整体重建，词条表和前缀树作为一个元组整体替换
+        self._dead = 0
+        self._state: Tuple[List[Optional[Dict]], PrefixTrie] = self._build_state([])
+
+    def _build_state(self, entries: List[Optional[Dict]]) -> Tuple[List[Optional[Dict]], PrefixTrie]:
+        def rank(entry: int) -> tuple:
+            suggestion = entries[entry]
+            return (-suggestion['popularity'], len(suggestion['text']), suggestion['text'], suggestion['type'])
+
+        return entries, PrefixTrie(rank, self.limit)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join((text or '').lower().split())
+
+    @classmethod
+    def prefix_keys(cls, text: str) -> List[str]:
+        """完整文本及从每个词开始的后缀"""
+        words = cls.normalize(text).split(' ')
+        return list(dict.fromkeys(' '.join(words[i:]) for i in range(len(words)) if words[i]))
+
+    @classmethod
+    def load(cls) -> Dict[SuggestionKey, Dict]:
+        """从数据库读取全部词条及热度"""
+        from .ocr_service import OCRService
+
+        popularity = dict(
+            UserRecord.objects.values('coffee_bean')
+            .annotate(users=Count('user', distinct=True))
+            .values_list('coffee_bean', 'users')
+        )
+
+        suggestions: Dict[SuggestionKey, Dict] = {}
+        totals: Dict[SuggestionKey, int] = defaultdict(int)
+
+        def add(kind, text, score, coffee_id=None):
+            text = ' '.join((text or '').split())
+            if not text:
+                return
+            key = (kind, cls.normalize(text))
+            totals[key] += score
+            suggestions.setdefault(key, {'text': text, 'type': kind, 'coffee_id': coffee_id})
+
+        for name in Origin.objects.values_list('name', flat=True):
+            add('origin', name, 0)
+
+        process_display = dict(CoffeeBean.PROCESS_CHOICES)
+        variety_popularity: Dict[str, int] = defaultdict(int)
+        process_popularity: Dict[str, int] = defaultdict(int)
+        rows = CoffeeBean.objects.filter(is_active=True).values_list(
+            'id', 'name', 'origin__name', 'region', 'variety', 'process'
+        )
+        for bean_id, name, origin, region, variety, process in rows:
+            score = popularity.get(bean_id, 0)
+            add('coffee', name, score, coffee_id=bean_id)
+            add('origin', origin, score)
+            add('region', region, score)
+            add('variety', variety, score)
+            variety_popularity[cls.normalize(variety)] += score
+            process_popularity[process] += score
+
+        for process, display in process_display.items():
+            add('process', str(display), process_popularity[process])
+        for alias, process in OCRService.PROCESS_MAPPING.items():
+            add('process', alias, process_popularity[process])
+
+        # 品种别名的热度取同一品种在目录中各写法的热度
+        aliases_by_variety: Dict[str, List[str]] = defaultdict(list)
+        for alias, variety in OCRService.VARIETY_MAPPING.items():
+            aliases_by_variety[variety].append(alias)
+        for aliases in aliases_by_variety.values():
+            score = max(variety_popularity.get(cls.normalize(alias), 0) for alias in aliases)
+            for alias in aliases:
+                if ('variety', cls.normalize(alias)) not in suggestions:
+                    add('variety', alias, score)
+
+        for key, suggestion in suggestions.items():
+            suggestion['popularity'] = totals[key]
+        return suggestions
+
+    def apply(self, suggestions: Dict[SuggestionKey, Dict]) -> None:
+        """与当前词条比较，只增删改有变化的词条；空位过多时重建"""
+        stale = [key for key in self.suggestions if suggestions.get(key) != self.suggestions[key]]
+        entries, trie = self._state
+        if (self._dead + len(stale)) * 2 > len(entries):
+            self.rebuild(suggestions)
+            return
+
+        for key in stale:
+            entry = self.entry_ids.pop(key)
+            for prefix in self.prefix_keys(key[1]):
+                trie.remove(prefix, entry)
+            entries[entry] = None
+            self._dead += 1
+            del self.suggestions[key]
+
+        for key, suggestion in suggestions.items():
+            if key in self.suggestions:
+                continue
+            entry = len(entries)
+            entries.append(suggestion)
+            self.entry_ids[key] = entry
+            self.suggestions[key] = suggestion
+            for prefix in self.prefix_keys(key[1]):
+                trie.add(prefix, entry)
+
+    def rebuild(self, suggestions: Dict[SuggestionKey, Dict]) -> None:
+        """建好新的词条表和前缀树后一次替换，正在读取旧结构的请求不受影响"""
+        entries, trie = self._build_state(list(suggestions.values()))
+        entry_ids = {}
+        for entry, key in enumerate(suggestions):
+            entry_ids[key] = entry
+            for prefix in self.prefix_keys(key[1]):
+                trie.add(prefix, entry)
+        self.suggestions = dict(suggestions)
+        self.entry_ids = entry_ids
+        self._dead = 0
+        self._state = (entries, trie)
+
+    def refresh_if_stale(self) -> None:
+        version = get_catalog_version()
+        max_age = getattr(settings, 'AUTOCOMPLETE_POPULARITY_TTL', 300)
+        if version == self._version and time.monotonic() - self._loaded_at < max_age:
+            return
+
+        with self._lock:
+            if version == self._version and time.monotonic() - self._loaded_at < max_age:
+                return
+            self.apply(self.load())
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """返回前缀匹配的联想词，按热度排序"""
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        self.refresh_if_stale()
+        entries, trie = self._state
+        suggestions = [entries[entry] for entry in trie.top(prefix)]
+        return [dict(suggestion) for suggestion in suggestions if suggestion is not None][:limit]
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,111 @@
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+
+def bigrams(text: str) -> List[str]:
+    """按空白切分后取每个词的字符 2-gram，中英文统一处理"""
+    grams = []
+    for token in text.split():
+        grams.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return grams
+
+
+class BM25FMatrix:
+    """
+    BM25F 打分矩阵
+    以字符 2-gram 为词项，预先把各字段的词频按字段权重和长度归一化合并、
+    做 BM25 饱和并乘以 IDF，得到 (咖啡豆 × 词项) 的稀疏矩阵；
+    查询时取出查询词项对应的列做一次稀疏矩阵乘法即可得到所有咖啡豆的分数
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, field_texts: Dict[str, List[str]], field_weights: Dict[str, float]):
+        import numpy as np
+        from scipy.sparse import csc_matrix
+
+        fields = list(field_texts)
+        doc_count = len(field_texts[fields[0]]) if fields else 0
+        # 目录中未出现的词项按 df=0 计 IDF，只用于计算理论最高分
+        self.unseen_idf = math.log(1 + (doc_count + 0.5) / 0.5)
+
+        field_grams = {
+            field: [Counter(bigrams(text)) for text in texts]
+            for field, texts in field_texts.items()
+        }
+        avg_length = {
+            field: (sum(sum(grams.values()) for grams in docs) / doc_count) if doc_count else 0
+            for field, docs in field_grams.items()
+        }
+        # 权重最高的字段，计算查询自身得分时把查询视为该字段的文本
+        self.top_field = max(field_weights, key=field_weights.get) if field_weights else None
+        self.top_weight = field_weights.get(self.top_field, 0)
+        self.top_avg_length = avg_length.get(self.top_field, 0)
+
+        # 各字段加权、长度归一化后的合并词频
+        weighted_tf: List[Dict[str, float]] = [defaultdict(float) for _ in range(doc_count)]
+        for field, docs in field_grams.items():
+            weight = field_weights[field]
+            for doc, grams in enumerate(docs):
+                length = sum(grams.values())
+                norm = 1 - self.B + self.B * (length / avg_length[field] if avg_length[field] else 0)
+                for gram, tf in grams.items():
+                    weighted_tf[doc][gram] += weight * tf / norm
+
+        document_frequency = Counter(gram for grams in weighted_tf for gram in grams)
+        self.vocabulary = {gram: i for i, gram in enumerate(document_frequency)}
+        self.idf = np.zeros(len(self.vocabulary))
+        for gram, df in document_frequency.items():
+            self.idf[self.vocabulary[gram]] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+        rows, cols, data = [], [], []
+        for doc, grams in enumerate(weighted_tf):
+            for gram, tf in grams.items():
+                col = self.vocabulary[gram]
+                rows.append(doc)
+                cols.append(col)
+                data.append(self.idf[col] * tf / (self.K1 + tf))
+
+        self.matrix = csc_matrix(
+            (data, (rows, cols)), shape=(doc_count, len(self.vocabulary)), dtype=np.float64
+        )
+
+    def score(self, keywords: List[str]) -> Tuple[object, float]:
+        """
+        返回 (每个咖啡豆的分数数组, 查询自身得分)
+        每个关键词的 2-gram 权重之和为 1，长关键词不会因 2-gram 多而占优；
+        查询自身得分为把查询当作一条只有最高权重字段的文档时的分数（目录中没有的词项按 df=0 计），
+        精确命中该字段的咖啡豆分数与之相当，用于把分数换算为置信度
+        """
+        import numpy as np
+
+        weights: Dict[str, float] = defaultdict(float)
+        query_tf: Counter = Counter()
+        for keyword in keywords:
+            grams = bigrams(keyword.lower())
+            query_tf.update(grams)
+            for gram in grams:
+                weights[gram] += 1 / len(grams)
+
+        seen = [gram for gram in weights if gram in self.vocabulary]
+        if not seen:
+            return np.zeros(self.matrix.shape[0]), 0.0
+
+        cols = np.fromiter((self.vocabulary[gram] for gram in seen), dtype=np.int64)
+        query = np.fromiter((weights[gram] for gram in seen), dtype=np.float64)
+        scores = self.matrix[:, cols] @ query
+        return scores, self.self_score(weights, query_tf)
+
+    def self_score(self, weights: Dict[str, float], query_tf: Counter) -> float:
+        length = sum(query_tf.values())
+        ratio = length / self.top_avg_length if self.top_avg_length else 0
+        norm = 1 - self.B + self.B * ratio
+        total = 0.0
+        for gram, weight in weights.items():
+            col = self.vocabulary.get(gram)
+            idf = self.idf[col] if col is not None else self.unseen_idf
+            tf = self.top_weight * query_tf[gram] / norm
+            total += weight * idf * tf / (self.K1 + tf)
+        return float(total)
@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from ..models import CoffeeBean, Origin
+
+T = TypeVar('T')
+
+
+_version_lock = threading.Lock()
+_version: Optional[str] = None
+_version_checked_at = 0.0
+
+_caches = []
+
+
+def get_catalog_version() -> str:
+    """
+    获取咖啡目录版本戳
+    由咖啡豆/产地的数量和最后更新时间组成，跨进程一致；
+    在 CATALOG_REVALIDATE_SECONDS 内复用上一次的结果
+    """
+    global _version, _version_checked_at
+
+    max_age = getattr(settings, 'CATALOG_REVALIDATE_SECONDS', 5)
+    now = time.monotonic()
+    with _version_lock:
+        if _version is not None and now - _version_checked_at < max_age:
+            return _version
+
+    beans = CoffeeBean.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    origins = Origin.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    version = '{}:{}:{}:{}'.format(
+        beans['count'],
+        beans['updated'].isoformat() if beans['updated'] else '',
+        origins['count'],
+        origins['updated'].isoformat() if origins['updated'] else '',
+    )
+
+    with _version_lock:
+        _version = version
+        _version_checked_at = now
+    return version
+
+
+def invalidate_catalog() -> None:
+    """本进程内的目录数据发生变化，下次访问时重新校验版本"""
+    global _version
+    with _version_lock:
+        _version = None
+    for cache in _caches:
+        cache.invalidate()
+
+
+class CatalogBoundCache(Generic[T]):
+    """
+    随咖啡目录版本失效的进程内缓存
+    builder 负责从数据库构建缓存对象，构建结果在版本不变时复用
+    """
+
+    def __init__(self, builder: Callable[[], T]):
+        self._builder = builder
+        self._lock = threading.Lock()
+        # (版本戳, 缓存对象)，整体替换保证读取时两者一致
+        self._entry: Optional[Tuple[str, T]] = None
+        _caches.append(self)
+
+    def get(self) -> T:
+        version = get_catalog_version()
+        entry = self._entry
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry[0] != version:
+                entry = (version, self._builder())
+                self._entry = entry
+            return entry[1]
+
+    def invalidate(self) -> None:
+        self._entry = None
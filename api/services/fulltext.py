@@ -0,0 +1,111 @@
+import re
+from typing import Iterable, List, Optional
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+
+# 中日韩统一表意文字，逐字切分
+CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile(rf'[{CJK}]|[^\W_{CJK}]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """小写后切词：汉字逐字成词，其余按连续字母数字成词"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def build_document(name, origin_name, region, variety, flavor_notes) -> str:
+    """拼出咖啡豆的全文检索文本，字段与原 icontains 搜索一致"""
+    parts = [name, origin_name, region, variety] + [str(flavor) for flavor in flavor_notes or []]
+    return ' '.join(token for part in parts for token in tokenize(part))
+
+
+class FullTextSearch:
+    """
+    咖啡豆全文检索
+    PostgreSQL 使用 to_tsvector('simple', search_document) 上的 GIN 索引，
+    SQLite 使用 FTS5 影子表；两者都不可用时返回 None，由调用方退回 icontains。
+    汉字逐字切分后按短语匹配，效果等同子串匹配；每段查询词的最后一个词按前缀匹配
+    """
+
+    FTS_TABLE = 'api_coffeebean_fts'
+    CONFIG = 'simple'
+
+    _sqlite_available = None
+
+    @classmethod
+    def backend(cls) -> Optional[str]:
+        """当前数据库可用的全文检索后端: 'postgresql' / 'sqlite' / None"""
+        if connection.vendor == 'postgresql':
+            return 'postgresql'
+        if connection.vendor == 'sqlite':
+            if cls._sqlite_available is None:
+                with connection.cursor() as cursor:
+                    cls._sqlite_available = cls.FTS_TABLE in connection.introspection.table_names(cursor)
+            if cls._sqlite_available:
+                return 'sqlite'
+        return None
+
+    @classmethod
+    def query_phrases(cls, search: str) -> List[List[str]]:
+        """按空白分段，每段切词后作为一个短语，段之间为 AND"""
+        return [tokens for tokens in (tokenize(part) for part in search.split()) if tokens]
+
+    @classmethod
+    def filter(cls, queryset: QuerySet, search: str) -> Optional[QuerySet]:
+        """
+        返回按相关度排序的匹配结果
+        没有可用后端或查询中没有可检索的词时返回 None
+        """
+        phrases = cls.query_phrases(search)
+        backend = cls.backend()
+        if not phrases or backend is None:
+            return None
+
+        if backend == 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+            vector = SearchVector('search_document', config=cls.CONFIG)
+            query = SearchQuery(
+                ' & '.join(' <-> '.join(tokens) + ':*' for tokens in phrases),
+                search_type='raw',
+                config=cls.CONFIG,
+            )
+            return queryset.annotate(search=vector).filter(search=query).annotate(
+                search_rank=SearchRank(vector, query)
+            ).order_by('-search_rank', '-created_at')
+
+        match = ' AND '.join('"%s" *' % ' '.join(tokens) for tokens in phrases)
+        table = cls.FTS_TABLE
+        # bm25() 越小越相关
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT bm25({table}) FROM {table} '
+                f'WHERE {table} MATCH %s AND rowid = api_coffeebean.id',
+                [match],
+            )
+        ).order_by('search_rank', '-created_at')
+
+    @classmethod
+    def sync(cls, beans: Iterable) -> None:
+        """把咖啡豆的检索文本写入 FTS5 影子表（PostgreSQL 的表达式索引自动维护）"""
+        if cls.backend() != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            for bean in beans:
+                cursor.execute(f'DELETE FROM {cls.FTS_TABLE} WHERE rowid = %s', [bean.pk])
+                cursor.execute(
+                    f'INSERT INTO {cls.FTS_TABLE} (rowid, search_document) VALUES (%s, %s)',
+                    [bean.pk, bean.search_document],
+                )
+
+    @classmethod
+    def remove(cls, bean_id: int) -> None:
+        """从 FTS5 影子表删除咖啡豆"""
+        if cls.backend() != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {cls.FTS_TABLE} WHERE rowid = %s', [bean_id])
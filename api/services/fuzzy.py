@@ -0,0 +1,89 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    带相邻交换的编辑距离 (OSA)
+    超过 max_distance 时提前返回 max_distance + 1
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and previous2 is not None
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(term: str, distance: int) -> Set[str]:
+    """term 删除至多 distance 个字符得到的所有字符串"""
+    results = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {
+            word[:i] + word[i + 1:]
+            for word in frontier if len(word) > 1
+            for i in range(len(word))
+        }
+        results |= frontier
+    return results
+
+
+class DeletionIndex:
+    """
+    SymSpell 式删除索引
+    预先为词表中每个词生成删除变体，查询时只需生成查询词的删除变体并查表，
+    再用编辑距离校验候选
+    """
+
+    # 短于该长度的词不做模糊匹配
+    MIN_LENGTH = 4
+
+    def __init__(self, terms: Iterable[str]):
+        self.deletes: Dict[str, List[str]] = defaultdict(list)
+        for term in set(terms):
+            if len(term) < self.MIN_LENGTH:
+                continue
+            for variant in _deletes(term, self.max_distance(term)):
+                self.deletes[variant].append(term)
+        self.deletes = dict(self.deletes)
+
+    @classmethod
+    def max_distance(cls, term: str) -> int:
+        """允许的编辑距离随词长增加：4-7 个字符 1，8 个及以上 2"""
+        if len(term) < cls.MIN_LENGTH:
+            return 0
+        return 1 if len(term) < 8 else 2
+
+    def lookup(self, query: str) -> List[Tuple[int, str]]:
+        """返回 [(编辑距离, 词)]，按距离排序，不含完全相同的词"""
+        max_distance = self.max_distance(query)
+        if max_distance == 0:
+            return []
+
+        candidates = set()
+        for variant in _deletes(query, max_distance):
+            candidates.update(self.deletes.get(variant, ()))
+
+        found = []
+        for term in candidates:
+            if term == query:
+                continue
+            distance = edit_distance(query, term, max_distance)
+            if distance <= max_distance:
+                found.append((distance, term))
+        found.sort()
+        return found
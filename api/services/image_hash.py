@@ -0,0 +1,135 @@
+import io
+import threading
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..models import OCRCache
+
+
+def perceptual_hash(image_data: bytes) -> Optional[str]:
+    """
+    计算图片的 dHash (64 位)
+    同一包装的不同照片哈希相近，返回 16 位十六进制字符串；无法解码时返回 None
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        # JPEG 直接按缩小尺寸解码，避免解出整张大图
+        image.draft('L', (64, 64))
+        image = image.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    except Exception:
+        return None
+
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return f'{value:016x}'
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """按汉明距离组织的 BK 树，用于查找距离阈值内的哈希"""
+
+    def __init__(self):
+        # 节点: (哈希值, 条目列表, {距离: 子节点})
+        self.root = None
+
+    def add(self, value: int, item) -> None:
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def find(self, value: int, max_distance: int) -> List[Tuple[int, object]]:
+        """返回 [(距离, 条目)]，按距离排序"""
+        if self.root is None:
+            return []
+
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                found.extend((distance, item) for item in items)
+            for child_distance in range(distance - max_distance, distance + max_distance + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class PerceptualHashIndex:
+    """
+    OCRCache 感知哈希的进程内索引
+    每次查询前按创建时间增量加载其它进程新写入的缓存条目，并向前重叠 SYNC_OVERLAP 重新扫描：
+    id 和创建时间在插入时确定、提交顺序却可能不同，只按 id 增量加载会永久漏掉较晚提交的条目
+    """
+
+    SYNC_OVERLAP = timedelta(minutes=5)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = BKTree()
+        self._tree_size = 0
+        # 索引中仍有效的条目: {缓存 id: 哈希值}
+        self._hashes: Dict[int, int] = {}
+        self._synced_at = None
+
+    def _sync(self) -> None:
+        rows = OCRCache.objects.exclude(perceptual_hash='')
+        if self._synced_at is not None:
+            rows = rows.filter(created_at__gte=self._synced_at - self.SYNC_OVERLAP)
+        for cache_id, phash, created_at in rows.values_list('id', 'perceptual_hash', 'created_at'):
+            if self._synced_at is None or created_at > self._synced_at:
+                self._synced_at = created_at
+            if cache_id in self._hashes:
+                continue
+            value = int(phash, 16)
+            self._hashes[cache_id] = value
+            self._tree.add(value, cache_id)
+            self._tree_size += 1
+
+    def find(self, phash: str, max_distance: int) -> List[int]:
+        """返回距离阈值内的缓存 id，最相近的在前"""
+        with self._lock:
+            self._sync()
+            return [
+                cache_id for _, cache_id in self._tree.find(int(phash, 16), max_distance)
+                if cache_id in self._hashes
+            ]
+
+    def evict(self, cache_ids: Iterable[int]) -> None:
+        """移除已删除的缓存条目，失效条目超过一半时重建 BK 树"""
+        with self._lock:
+            for cache_id in cache_ids:
+                self._hashes.pop(cache_id, None)
+            if self._tree_size > 2 * len(self._hashes) + 64:
+                self._tree = BKTree()
+                for cache_id, value in self._hashes.items():
+                    self._tree.add(value, cache_id)
+                self._tree_size = len(self._hashes)
+
+
+phash_index = PerceptualHashIndex()
@@ -0,0 +1,71 @@
+import hashlib
+import io
+import threading
+from typing import Tuple
+
+from django.conf import settings
+
+
+class ImageIngestService:
+    """
+    OCR 上传图片预处理
+    分块计算哈希，避免整张原图读入内存；超出像素预算的图片缩小并重新编码后再送 OCR
+    """
+
+    _decode_semaphore = None
+    _semaphore_lock = threading.Lock()
+
+    @classmethod
+    def get_decode_semaphore(cls) -> threading.BoundedSemaphore:
+        """限制同时解码的图片数，控制解码占用的峰值内存"""
+        with cls._semaphore_lock:
+            if cls._decode_semaphore is None:
+                cls._decode_semaphore = threading.BoundedSemaphore(
+                    getattr(settings, 'OCR_MAX_CONCURRENT_DECODES', 2)
+                )
+            return cls._decode_semaphore
+
+    @classmethod
+    def ingest(cls, upload) -> Tuple[str, bytes]:
+        """
+        处理上传文件
+        返回: (原始文件的 MD5, 送 OCR 的图片数据)
+        """
+        md5 = hashlib.md5()
+        for chunk in upload.chunks():
+            md5.update(chunk)
+        upload.seek(0)
+
+        with cls.get_decode_semaphore():
+            image_data = cls.prepare(upload)
+        return md5.hexdigest(), image_data
+
+    @classmethod
+    def prepare(cls, fileobj) -> bytes:
+        """像素数在 OCR_MAX_PIXELS 以内的图片原样返回，否则缩小后以 JPEG 重新编码"""
+        from PIL import Image, ImageOps
+
+        max_pixels = getattr(settings, 'OCR_MAX_PIXELS', 4_000_000)
+        try:
+            image = Image.open(fileobj)
+            width, height = image.size
+        except Exception:
+            fileobj.seek(0)
+            return fileobj.read()
+
+        if max_pixels <= 0 or width * height <= max_pixels:
+            fileobj.seek(0)
+            return fileobj.read()
+
+        scale = (max_pixels / (width * height)) ** 0.5
+        target = (max(1, int(width * scale)), max(1, int(height * scale)))
+
+        # JPEG 直接按接近目标的尺寸解码，不解出整张原图
+        image.draft('RGB', target)
+        # 重新编码会丢失 EXIF，先按拍摄方向旋转
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image.thumbnail(target, Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=getattr(settings, 'OCR_JPEG_QUALITY', 85))
+        return output.getvalue()
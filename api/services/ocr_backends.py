@@ -0,0 +1,158 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+
+class OCRBackendError(Exception):
+    """OCR 后端调用失败（网络错误、超时、接口返回错误等）"""
+
+
+class OCRBackend:
+    """
+    OCR 后端接口
+    子类实现 recognize_batch，单张识别默认走批量接口
+    image_hashes 为各图片原始上传文件的 MD5（送识别的图片可能已缩小），
+    后端可忽略，测试替身用它匹配固定结果
+    """
+
+    # 单次批量请求最多包含的图片数
+    batch_limit = 16
+
+    def recognize(self, image_data: bytes, timeout: Optional[float] = None,
+                  image_hash: Optional[str] = None) -> Tuple[str, float]:
+        """识别单张图片，返回 (识别文本, 置信度)"""
+        image_hashes = [image_hash] if image_hash else None
+        return self.recognize_batch([image_data], timeout=timeout, image_hashes=image_hashes)[0]
+
+    def recognize_batch(self, images: List[bytes], timeout: Optional[float] = None,
+                        image_hashes: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """批量识别，结果顺序与 images 一致；失败时抛出 OCRBackendError"""
+        raise NotImplementedError
+
+
+class GoogleVisionBackend(OCRBackend):
+    """
+    Google Cloud Vision 后端
+    进程内复用同一个 ImageAnnotatorClient（gRPC 通道本身支持并发调用），
+    避免每次请求重新建立连接和认证
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google.cloud import vision
+                    self._client = vision.ImageAnnotatorClient()
+        return self._client
+
+    @staticmethod
+    def parse_annotations(texts) -> Tuple[str, float]:
+        if not texts:
+            return "", 0.0
+
+        # 第一个结果是完整的文本
+        full_text = texts[0].description
+        # 计算平均置信度
+        confidences = [text.confidence for text in texts[1:] if hasattr(text, 'confidence')]
+        avg_confidence = sum(confidences) / len(confidences) if confidences else 0.8
+        return full_text, avg_confidence
+
+    def recognize_batch(self, images: List[bytes], timeout: Optional[float] = None,
+                        image_hashes: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        try:
+            from google.cloud import vision
+
+            client = self.get_client()
+            feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+            results = []
+            for start in range(0, len(images), self.batch_limit):
+                requests = [
+                    vision.AnnotateImageRequest(image=vision.Image(content=image_data), features=[feature])
+                    for image_data in images[start:start + self.batch_limit]
+                ]
+                response = client.batch_annotate_images(requests=requests, timeout=timeout)
+                for item in response.responses:
+                    if item.error.message:
+                        raise OCRBackendError(item.error.message)
+                    results.append(self.parse_annotations(item.text_annotations))
+            return results
+        except OCRBackendError:
+            raise
+        except Exception as e:
+            raise OCRBackendError(str(e)) from e
+
+
+class FakeOCRBackend(OCRBackend):
+    """
+    本地确定性 OCR，用于离线测试和压测
+    优先按 OCR_FAKE_FIXTURE（{原始上传图片MD5: 文本} 的 JSON 文件）返回固定文本，
+    否则按图片哈希从示例标签中选取；OCR_FAKE_LATENCY_MS 模拟每次调用的延迟
+    """
+
+    # 示例标签文本，最后一条不匹配任何咖啡
+    LABELS = [
+        '埃塞俄比亚 耶加雪菲 G1 水洗 Heirloom',
+        '埃塞俄比亚西达摩日晒 蓝莓 草莓',
+        '肯尼亚 AA 麒麟雅加 SL28 水洗',
+        '哥伦比亚 慧兰 卡杜拉 Washed',
+        '巴拿马 波奎特 瑰夏 Geisha',
+        '印度尼西亚 苏门答腊 林东 湿刨法',
+        'Fresh Roasted Daily 500g',
+    ]
+
+    def __init__(self):
+        self.fixture: Dict[str, str] = {}
+        fixture_path = getattr(settings, 'OCR_FAKE_FIXTURE', '')
+        if fixture_path:
+            with open(fixture_path, encoding='utf-8') as f:
+                self.fixture = json.load(f)
+
+    def recognize_batch(self, images: List[bytes], timeout: Optional[float] = None,
+                        image_hashes: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        latency = getattr(settings, 'OCR_FAKE_LATENCY_MS', 0) / 1000
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise OCRBackendError('OCR request timed out')
+        if latency > 0:
+            time.sleep(latency)
+
+        results = []
+        for index, image_data in enumerate(images):
+            digest = image_hashes[index] if image_hashes else hashlib.md5(image_data).hexdigest()
+            if digest in self.fixture:
+                results.append((self.fixture[digest], 0.9))
+            else:
+                results.append((self.LABELS[int(digest, 16) % len(self.LABELS)], 0.9))
+        return results
+
+
+OCR_BACKENDS = {
+    'google': GoogleVisionBackend,
+    'fake': FakeOCRBackend,
+}
+
+_backend: Optional[OCRBackend] = None
+_backend_name: Optional[str] = None
+_backend_lock = threading.Lock()
+
+
+def get_ocr_backend() -> OCRBackend:
+    """按 OCR_BACKEND 配置返回进程内共享的后端实例"""
+    global _backend, _backend_name
+
+    name = getattr(settings, 'OCR_BACKEND', 'google')
+    with _backend_lock:
+        if _backend is None or _backend_name != name:
+            if name not in OCR_BACKENDS:
+                raise OCRBackendError(f'Unknown OCR backend: {name}')
+            _backend = OCR_BACKENDS[name]()
+            _backend_name = name
+        return _backend
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from ..models import OCRJob, User
+from .ocr_service import OCRService
+
+
+class OCRJobService:
+    """
+    异步 OCR 任务服务
+    上传后立即创建任务，由进程内线程池执行识别，结果写回数据库，
+    因此任意 worker 进程都可以查询任务状态
+    """
+
+    _executor = None
+    _executor_lock = threading.Lock()
+    # 本进程内执行中的任务，用于长轮询时直接等待完成事件
+    _events: Dict[str, threading.Event] = {}
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'OCR_WORKER_THREADS', 4),
+                    thread_name_prefix='ocr-job',
+                )
+            return cls._executor
+
+    @classmethod
+    def submit(cls, user: User, image_data: bytes, image_hash: Optional[str] = None) -> OCRJob:
+        """创建任务并提交到线程池"""
+        job = OCRJob.objects.create(user=user)
+
+        # 事务提交后再登记完成事件并执行，保证工作线程能读到任务，事务回滚时也不会遗留事件
+        def start():
+            cls._events[str(job.pk)] = threading.Event()
+            cls.get_executor().submit(cls.run, job.pk, image_data, image_hash)
+
+        transaction.on_commit(start)
+        return job
+
+    @classmethod
+    def run(cls, job_id, image_data: bytes, image_hash: Optional[str] = None) -> None:
+        """在工作线程中执行识别"""
+        try:
+            OCRJob.objects.filter(pk=job_id, status='pending').update(status='running')
+            # OCR 后端失败时任务记为 failed，与"没有匹配结果"区分开
+            result = OCRService.recognize_and_search(image_data, image_hash=image_hash, raise_errors=True)
+            # 已被判定超时的任务不再改写
+            OCRJob.objects.filter(pk=job_id, status='running').update(
+                status='succeeded',
+                result={
+                    'text': result['text'],
+                    'keywords': result['keywords'],
+                    'results': OCRService.serialize_results(result['results']),
+                    'ocr_confidence': result['ocr_confidence'],
+                    'from_cache': result['from_cache'],
+                },
+                finished_at=timezone.now(),
+            )
+        except Exception as e:
+            OCRJob.objects.filter(pk=job_id, status__in=['pending', 'running']).update(
+                status='failed',
+                error=str(e),
+                finished_at=timezone.now(),
+            )
+        finally:
+            event = cls._events.pop(str(job_id), None)
+            if event:
+                event.set()
+            close_old_connections()
+
+    @classmethod
+    def wait(cls, job: OCRJob, timeout: float) -> OCRJob:
+        """
+        长轮询：等待任务完成或超时
+        任务在本进程执行时等待完成事件，否则定期查询数据库
+        """
+        deadline = time.monotonic() + timeout
+        event = cls._events.get(str(job.pk))
+        if event is not None:
+            event.wait(timeout)
+            job.refresh_from_db()
+            return job
+
+        while not job.is_finished:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(0.2, remaining))
+            job.refresh_from_db()
+        return job
+
+    @classmethod
+    def expire_if_stale(cls, job: OCRJob) -> OCRJob:
+        """
+        创建超过 OCR_JOB_TIMEOUT 秒仍未完成的任务标记为失败
+        执行任务的进程重启或线程池积压时，客户端不会一直轮询到 pending
+        """
+        timeout = getattr(settings, 'OCR_JOB_TIMEOUT', 300)
+        if job.is_finished or timeout <= 0 or job.created_at > timezone.now() - timedelta(seconds=timeout):
+            return job
+        OCRJob.objects.filter(pk=job.pk, status__in=['pending', 'running']).update(
+            status='failed',
+            error='任务超时',
+            finished_at=timezone.now(),
+        )
+        job.refresh_from_db()
+        return job
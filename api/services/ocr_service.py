@@ -1,8 +1,19 @@
 import hashlib
 import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from typing import List, Dict, Optional, Tuple
+from django.conf import settings
+from django.db import DatabaseError
 from django.db.models import Q
-from ..models import CoffeeBean, OCRCache
+from django.utils import timezone
+from ..models import CoffeeBean, Origin, OCRCache
+from .catalog import CatalogBoundCache, get_catalog_version
+from .image_hash import perceptual_hash, phash_index
+from .ocr_backends import OCRBackendError, get_ocr_backend
+from .search_index import search_index
+from .segmenter import KeywordSegmenter
+from .singleflight import SingleFlight
 
 
 class OCRService:
@@ -51,189 +62,417 @@ class OCRService:
         return hashlib.md5(image_data).hexdigest()
     
     @classmethod
-    def recognize_image(cls, image_data: bytes) -> Tuple[str, float]:
+    def recognize_images(cls, images: List[bytes],
+                         image_hashes: Optional[List[str]] = None) -> List[Tuple[str, float]]:
         """
-        识别图片中的文字
-        返回: (识别文本, 置信度)
+        批量识别多张图片，一次后端调用
+        image_hashes: 各图片原始上传文件的哈希
+        失败时抛出 OCRBackendError
         """
-        try:
-            from google.cloud import vision
-            
-            client = vision.ImageAnnotatorClient()
-            image = vision.Image(content=image_data)
-            
-            response = client.text_detection(image=image)
-            texts = response.text_annotations
-            
-            if texts:
-                # 第一个结果是完整的文本
-                full_text = texts[0].description
-                # 计算平均置信度
-                confidences = [text.confidence for text in texts[1:] if hasattr(text, 'confidence')]
-                avg_confidence = sum(confidences) / len(confidences) if confidences else 0.8
-                
-                return full_text, avg_confidence
-            
-            return "", 0.0
-            
-        except Exception as e:
-            print(f"OCR Error: {e}")
-            # 如果 Google Cloud Vision 不可用，返回空结果
-            return "", 0.0
+        return get_ocr_backend().recognize_batch(
+            images, timeout=cls.get_timeout(), image_hashes=image_hashes
+        )
+    
+    @staticmethod
+    def get_timeout() -> Optional[float]:
+        timeout = getattr(settings, 'OCR_TIMEOUT', 10)
+        return timeout if timeout > 0 else None
     
     @classmethod
-    def clean_text(cls, text: str) -> List[str]:
-        """清洗文本，提取关键词"""
-        # 转换为小写
+    def normalize_text(cls, text: str) -> str:
+        """转小写，特殊字符替换为空格，合并空白"""
         text = text.lower()
         
         # 移除特殊字符，保留中英文和数字
         text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9\s]', ' ', text)
         
+        return ' '.join(text.split())
+    
+    @classmethod
+    def build_segmenter(cls) -> KeywordSegmenter:
+        """
+        由咖啡目录和映射表构建切分词典
+        映射表中的别名统一为目录里实际使用的写法，处理法统一为中文名称
+        """
+        catalog_terms = set()
+        catalog_varieties = set()
+        
+        for name in Origin.objects.values_list('name', flat=True):
+            catalog_terms.add(cls.normalize_text(name))
+        
+        rows = CoffeeBean.objects.filter(is_active=True).values_list('region', 'variety', 'flavor_notes')
+        for region, variety, flavor_notes in rows:
+            variety = cls.normalize_text(variety)
+            catalog_varieties.add(variety)
+            for value in [region, variety, *[str(flavor) for flavor in flavor_notes or []]]:
+                value = cls.normalize_text(value)
+                catalog_terms.add(value)
+                # 多词产区（如 "云南 普洱"）的每个部分也可单独命中
+                catalog_terms.update(value.split())
+        
+        canonical = {
+            term: term for term in catalog_terms
+            if len(term) >= 2 and term not in cls.STOP_WORDS
+        }
+        
+        for alias, term in cls.alias_terms(catalog_varieties).items():
+            canonical.setdefault(alias, term)
+        
+        return KeywordSegmenter(canonical)
+    
+    @classmethod
+    def alias_terms(cls, catalog_varieties) -> Dict[str, str]:
+        """
+        映射表中的别名 -> 目录里实际使用的写法
+        处理法统一为中文名称，品种取同一品种在目录中出现的写法
+        """
+        terms = {}
+        process_display = dict(CoffeeBean.PROCESS_CHOICES)
+        for alias, process in cls.PROCESS_MAPPING.items():
+            terms.setdefault(cls.normalize_text(alias), str(process_display[process]).lower())
+        
+        variety_aliases = {}
+        for alias, variety in cls.VARIETY_MAPPING.items():
+            variety_aliases.setdefault(variety, []).append(cls.normalize_text(alias))
+        for aliases in variety_aliases.values():
+            in_catalog = [alias for alias in aliases if alias in catalog_varieties]
+            for alias in aliases:
+                terms.setdefault(alias, in_catalog[0] if in_catalog else alias)
+        return terms
+    
+    @classmethod
+    def clean_text(cls, text: str) -> List[str]:
+        """
+        清洗文本，提取关键词
+        连写的中文（如 "埃塞俄比亚耶加雪菲水洗"）按目录词典切分为标准关键词
+        """
+        text = cls.normalize_text(text)
+        
         # 分词
-        words = text.split()
+        words = [word for word, _ in keyword_segmenter.get().segment(text)]
         
-        # 过滤停用词和短词
-        keywords = [
-            word for word in words
-            if len(word) >= 2 and word not in cls.STOP_WORDS
-        ]
+        # 过滤停用词、短词和重复词
+        keywords = []
+        for word in words:
+            if len(word) >= 2 and word not in cls.STOP_WORDS and word not in keywords:
+                keywords.append(word)
         
         return keywords
     
     @classmethod
-    def search_coffee_beans(cls, keywords: List[str]) -> List[Dict]:
+    def search_coffee_beans(cls, keywords: List[str], ranking: str = 'weighted') -> List[Dict]:
         """
         根据关键词搜索咖啡豆
+        ranking: 'weighted' 按字段固定权重打分，'bm25' 按 BM25F 打分
         返回匹配结果列表，按匹配度排序
         """
         if not keywords:
             return []
         
-        results = []
-        coffee_beans = CoffeeBean.objects.filter(is_active=True).select_related('origin')
+        index = search_index.get()
+        if ranking == 'bm25':
+            try:
+                items = index.search_bm25(keywords, limit=5)
+            except ImportError as e:
+                # 未安装 numpy / scipy 时退回固定权重打分
+                print(f"BM25 Error: {e}")
+                items = index.search(keywords, limit=5)
+        else:
+            # 倒排索引打分，只取回前5个结果对应的咖啡豆
+            items = index.search(keywords, limit=5)
+        return cls.load_results(items)
+    
+    @classmethod
+    def load_results(cls, items: List[Dict]) -> List[Dict]:
+        """
+        将 [{'coffee_id', ...}] 形式的匹配结果还原为带咖啡豆对象的结果
+        已删除的咖啡豆会被跳过
+        """
+        coffees = CoffeeBean.objects.select_related('origin').in_bulk(
+            [item['coffee_id'] for item in items]
+        )
         
-        for coffee in coffee_beans:
-            score = 0
-            matched_keywords = []
-            
-            coffee_text = f"{coffee.name} {coffee.origin.name} {coffee.region} {coffee.variety}"
-            coffee_text_lower = coffee_text.lower()
-            
-            for keyword in keywords:
-                keyword_lower = keyword.lower()
-                
-                # 名称匹配（权重最高）
-                if keyword_lower in coffee.name.lower():
-                    score += 10
-                    matched_keywords.append(keyword)
-                    continue
-                
-                # 产地匹配
-                if keyword_lower in coffee.origin.name.lower():
-                    score += 8
-                    matched_keywords.append(keyword)
-                    continue
-                
-                # 产区匹配
-                if keyword_lower in coffee.region.lower():
-                    score += 7
-                    matched_keywords.append(keyword)
-                    continue
-                
-                # 品种匹配
-                if keyword_lower in coffee.variety.lower():
-                    score += 6
-                    matched_keywords.append(keyword)
-                    continue
-                
-                # 处理法匹配
-                if keyword_lower in coffee.get_process_display().lower():
-                    score += 5
-                    matched_keywords.append(keyword)
-                    continue
-                
-                # 风味标签匹配
-                for flavor in coffee.flavor_notes:
-                    if keyword_lower in flavor.lower():
-                        score += 4
-                        matched_keywords.append(keyword)
-                        break
-            
-            if score > 0:
-                results.append({
-                    'coffee': coffee,
-                    'score': score,
-                    'confidence': min(score / (len(keywords) * 10), 1.0),
-                    'matched_keywords': list(set(matched_keywords))
-                })
+        return [
+            {
+                'coffee': coffees[item['coffee_id']],
+                'score': item['score'],
+                'confidence': item['confidence'],
+                'matched_keywords': item['matched_keywords']
+            }
+            for item in items
+            if item['coffee_id'] in coffees
+        ]
+    
+    @classmethod
+    def fresh_caches(cls):
+        """未过期的缓存（无匹配结果的缓存有有效期）"""
+        return OCRCache.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+        )
+    
+    @classmethod
+    def find_similar_cache(cls, phash: str) -> Optional[OCRCache]:
+        """按感知哈希查找近似图片的缓存"""
+        max_distance = getattr(settings, 'OCR_PHASH_MAX_DISTANCE', 6)
+        if max_distance < 0:
+            return None
+        
+        cache_ids = phash_index.find(phash, max_distance)
+        if not cache_ids:
+            return None
+        
+        # 已删除的条目从索引中移除，已过期的跳过，取仍有效的最相近一条
+        caches = OCRCache.objects.in_bulk(cache_ids)
+        phash_index.evict(cache_id for cache_id in cache_ids if cache_id not in caches)
+        now = timezone.now()
+        for cache_id in cache_ids:
+            cache = caches.get(cache_id)
+            if cache is not None and (cache.expires_at is None or cache.expires_at > now):
+                return cache
+        return None
+    
+    @classmethod
+    def serialize_results(cls, results: List[Dict]) -> List[Dict]:
+        """匹配结果转为可存入缓存的 JSON"""
+        return [
+            {
+                'coffee_id': item['coffee'].id,
+                'score': item['score'],
+                'confidence': item['confidence'],
+                'matched_keywords': item['matched_keywords']
+            }
+            for item in results
+        ]
+    
+    @classmethod
+    def save_cache(cls, image_hash: str, phash: Optional[str], recognized_text: str,
+                   ocr_confidence: float, keywords: List[str], results: List[Dict]) -> None:
+        """
+        保存完整识别结果；无匹配结果时写入带有效期的负缓存
+        以单条 INSERT ... ON CONFLICT DO UPDATE 写入，并发写同一哈希不会冲突
+        """
+        best_match = results[0] if results else None
+        expires_at = None
+        if not results:
+            ttl = getattr(settings, 'OCR_NEGATIVE_CACHE_TTL', 3600)
+            expires_at = timezone.now() + timedelta(seconds=ttl)
         
-        # 按分数排序
-        results.sort(key=lambda x: x['score'], reverse=True)
+        cache = OCRCache(
+            image_hash=image_hash,
+            perceptual_hash=phash or '',
+            recognized_text=recognized_text,
+            ocr_confidence=ocr_confidence,
+            keywords=keywords,
+            results=cls.serialize_results(results),
+            matched_coffee=best_match['coffee'] if best_match else None,
+            confidence=best_match['confidence'] if best_match else 0,
+            catalog_version=get_catalog_version(),
+            expires_at=expires_at,
+        )
+        OCRCache.objects.bulk_create(
+            [cache],
+            update_conflicts=True,
+            unique_fields=['image_hash'],
+            update_fields=[
+                'perceptual_hash', 'recognized_text', 'ocr_confidence', 'keywords', 'results',
+                'matched_coffee', 'confidence', 'catalog_version', 'expires_at',
+            ],
+        )
+    
+    @classmethod
+    def result_from_cache(cls, cache: OCRCache) -> Dict:
+        """
+        由缓存构建识别结果
+        咖啡目录变化后用缓存的识别文本在本地重新匹配，不再调用 OCR
+        重新匹配只更新结果，保留原有效期，负缓存不会因此续期
+        """
+        if cache.catalog_version != get_catalog_version():
+            keywords = cls.clean_text(cache.recognized_text) if cache.recognized_text else []
+            results = cls.search_coffee_beans(keywords)
+            best_match = results[0] if results else None
+            try:
+                OCRCache.objects.filter(pk=cache.pk).update(
+                    keywords=keywords,
+                    results=cls.serialize_results(results),
+                    matched_coffee=best_match['coffee'] if best_match else None,
+                    confidence=best_match['confidence'] if best_match else 0,
+                    catalog_version=get_catalog_version(),
+                )
+            except DatabaseError as e:
+                print(f"OCR Cache Error: {e}")
+        else:
+            keywords = cache.keywords
+            results = cls.load_results(cache.results)
+        
+        return {
+            'text': cache.recognized_text,
+            'keywords': keywords,
+            'results': results,
+            'ocr_confidence': cache.ocr_confidence,
+            'from_cache': True
+        }
+    
+    @classmethod
+    def find_cache(cls, image_hash: str, phash: Optional[str]) -> Optional[OCRCache]:
+        """先按图片哈希精确查找缓存，再按感知哈希查找近似图片"""
+        cache = cls.fresh_caches().filter(image_hash=image_hash).first()
+        if cache is None and phash:
+            cache = cls.find_similar_cache(phash)
+        return cache
+    
+    @classmethod
+    def empty_result(cls) -> Dict:
+        """OCR 后端调用失败时的结果，不写缓存"""
+        return {
+            'text': '',
+            'keywords': [],
+            'results': [],
+            'ocr_confidence': 0.0,
+            'from_cache': False
+        }
+    
+    @classmethod
+    def search_recognized_text(cls, image_hash: str, phash: Optional[str],
+                               recognized_text: str, ocr_confidence: float) -> Dict:
+        """由识别文本提取关键词、搜索咖啡豆并写入缓存"""
+        keywords = cls.clean_text(recognized_text) if recognized_text else []
+        results = cls.search_coffee_beans(keywords)
+        
+        # 保存缓存（包括没有匹配结果的情况），写入失败不影响本次结果
+        try:
+            cls.save_cache(image_hash, phash, recognized_text, ocr_confidence, keywords, results)
+        except DatabaseError as e:
+            print(f"OCR Cache Error: {e}")
         
-        return results[:5]  # 返回前5个结果
+        return {
+            'text': recognized_text,
+            'keywords': keywords,
+            'results': results,
+            'ocr_confidence': ocr_confidence,
+            'from_cache': False
+        }
     
     @classmethod
-    def recognize_and_search(cls, image_data: bytes, use_cache: bool = True) -> Dict:
+    def recognize_and_search(cls, image_data: bytes, use_cache: bool = True,
+                             image_hash: Optional[str] = None, raise_errors: bool = False) -> Dict:
         """
         识别图片并搜索咖啡豆
+        image_hash: 已计算好的原始上传文件哈希，未提供时按 image_data 计算
+        raise_errors: OCR 后端调用失败时抛出 OCRBackendError，默认返回空结果
         返回: {
             'text': 识别的原始文本,
             'keywords': 提取的关键词,
             'results': 匹配结果列表,
+            'ocr_confidence': OCR 置信度,
             'from_cache': 是否来自缓存
         }
         """
         # 计算图片哈希
-        image_hash = cls.calculate_image_hash(image_data)
+        if image_hash is None:
+            image_hash = cls.calculate_image_hash(image_data)
+        phash = perceptual_hash(image_data)
         
         # 检查缓存
         if use_cache:
-            cache = OCRCache.objects.filter(image_hash=image_hash).first()
+            cache = cls.find_cache(image_hash, phash)
             if cache:
-                return {
-                    'text': cache.recognized_text,
-                    'keywords': cls.clean_text(cache.recognized_text),
-                    'results': [{
-                        'coffee': cache.matched_coffee,
-                        'confidence': cache.confidence,
-                        'matched_keywords': []
-                    }] if cache.matched_coffee else [],
-                    'from_cache': True
-                }
-        
-        # 识别图片
-        recognized_text, ocr_confidence = cls.recognize_image(image_data)
-        
-        if not recognized_text:
-            return {
-                'text': '',
-                'keywords': [],
-                'results': [],
-                'from_cache': False
-            }
+                return cls.result_from_cache(cache)
         
-        # 提取关键词
-        keywords = cls.clean_text(recognized_text)
+        # 同一图片的并发请求只识别一次，其余请求等待并共享结果（包括后端错误）
+        try:
+            return ocr_flight.do(
+                image_hash,
+                lambda: cls.recognize_uncached(image_data, image_hash, phash, use_cache)
+            )
+        except OCRBackendError as e:
+            if raise_errors:
+                raise
+            print(f"OCR Error: {e}")
+            return cls.empty_result()
+    
+    @classmethod
+    def recognize_uncached(cls, image_data: bytes, image_hash: str,
+                           phash: Optional[str], use_cache: bool) -> Dict:
+        """调用 OCR 后端识别并写入缓存，后端调用失败时抛出 OCRBackendError"""
+        # 检查缓存之后，其它请求可能已完成识别并写入缓存
+        if use_cache:
+            cache = cls.fresh_caches().filter(image_hash=image_hash).first()
+            if cache:
+                return cls.result_from_cache(cache)
         
-        # 搜索咖啡豆
-        results = cls.search_coffee_beans(keywords)
+        # 识别图片；后端调用失败时不写缓存，下次重新识别
+        recognized_text, ocr_confidence = get_ocr_backend().recognize(
+            image_data, timeout=cls.get_timeout(), image_hash=image_hash
+        )
         
-        # 保存缓存
-        if results:
-            best_match = results[0]
-            OCRCache.objects.update_or_create(
-                image_hash=image_hash,
-                defaults={
-                    'recognized_text': recognized_text,
-                    'matched_coffee': best_match['coffee'],
-                    'confidence': best_match['confidence']
-                }
-            )
+        return cls.search_recognized_text(image_hash, phash, recognized_text, ocr_confidence)
+    
+    @classmethod
+    def recognize_and_search_batch(cls, images: List[Tuple[str, bytes]]) -> List[Dict]:
+        """
+        批量识别多张图片
+        images: [(图片哈希, 图片数据)]
+        相同哈希只处理一次，缓存用一次 IN 查询检查，未命中的图片分批并发送 OCR 后端；
+        返回结果与 images 顺序一致
+        """
+        unique = {}
+        for image_hash, image_data in images:
+            unique.setdefault(image_hash, image_data)
         
-        return {
-            'text': recognized_text,
-            'keywords': keywords,
-            'results': results,
-            'from_cache': False
+        caches = {
+            cache.image_hash: cache
+            for cache in cls.fresh_caches().filter(image_hash__in=list(unique))
         }
+        
+        outcomes = {}
+        misses = []
+        for image_hash, image_data in unique.items():
+            cache = caches.get(image_hash)
+            phash = perceptual_hash(image_data)
+            if cache is None and phash:
+                cache = cls.find_similar_cache(phash)
+            if cache:
+                outcomes[image_hash] = cls.result_from_cache(cache)
+            else:
+                misses.append((image_hash, phash, image_data))
+        
+        if misses:
+            try:
+                backend = get_ocr_backend()
+            except OCRBackendError as e:
+                print(f"OCR Error: {e}")
+                backend = None
+            
+            def recognize_chunk(chunk):
+                try:
+                    return cls.recognize_images(
+                        [image_data for _, _, image_data in chunk],
+                        [image_hash for image_hash, _, _ in chunk],
+                    )
+                except OCRBackendError as e:
+                    print(f"OCR Error: {e}")
+                    return None
+            
+            if backend is None:
+                # 后端不可用时与批次识别失败一样，未命中的图片都返回空结果
+                chunks, recognized = [misses], [None]
+            else:
+                chunks = [
+                    misses[start:start + backend.batch_limit]
+                    for start in range(0, len(misses), backend.batch_limit)
+                ]
+                with ThreadPoolExecutor(max_workers=min(len(chunks), 4)) as executor:
+                    recognized = list(executor.map(recognize_chunk, chunks))
+            
+            for chunk, texts in zip(chunks, recognized):
+                for (image_hash, phash, _), text in zip(chunk, texts or [None] * len(chunk)):
+                    if text is None:
+                        outcomes[image_hash] = cls.empty_result()
+                    else:
+                        outcomes[image_hash] = cls.search_recognized_text(image_hash, phash, *text)
+        
+        return [outcomes[image_hash] for image_hash, _ in images]
+
+
+keyword_segmenter = CatalogBoundCache(OCRService.build_segmenter)
+ocr_flight = SingleFlight()
@@ -0,0 +1,214 @@
+from collections import defaultdict
+from functools import cached_property
+from typing import Dict, List, Optional, Set
+
+from ..models import CoffeeBean
+from .bm25 import BM25FMatrix
+from .catalog import CatalogBoundCache
+from .fuzzy import DeletionIndex
+
+
+class CoffeeSearchIndex:
+    """
+    咖啡豆倒排索引
+    每个字段建立字符 1-gram / 2-gram 倒排表，查询时用倒排表求候选集，
+    再对候选做子串校验，结果与逐条扫描完全一致；
+    关键词完全没有命中时，再通过删除索引查找拼写相近的目录词或品种、处理法别名（权重减半）；
+    另提供 BM25F 排序模式，按词项稀有程度打分
+    """
+
+    # (字段, 权重)，顺序即匹配优先级：一个关键词只计入第一个命中的字段
+    FIELDS = [
+        ('name', 10),
+        ('origin', 8),
+        ('region', 7),
+        ('variety', 6),
+        ('process', 5),
+        ('flavor', 4),
+    ]
+
+    # 风味标签之间的分隔符，关键词中不会出现
+    FLAVOR_SEPARATOR = '\x00'
+
+    # 模糊命中的权重系数，低于精确命中
+    FUZZY_WEIGHT = 0.5
+
+    def __init__(self, rows, aliases: Optional[Dict[str, str]] = None):
+        """
+        rows: (id, name, origin_name, region, variety, process, flavor_notes)，
+        顺序即同分时的排序；
+        aliases: 别名 -> 目录中的写法（如 geisha -> 瑰夏），拼错的英文别名也能纠正到目录词
+        """
+        self.aliases = aliases or {}
+        process_display = dict(CoffeeBean.PROCESS_CHOICES)
+
+        self.bean_ids: List[int] = []
+        self.texts: Dict[str, List[str]] = {field: [] for field, _ in self.FIELDS}
+        self.postings: Dict[str, Dict[str, Set[int]]] = {
+            field: defaultdict(set) for field, _ in self.FIELDS
+        }
+        # 整词倒排表，供模糊匹配使用
+        self.tokens: Dict[str, Dict[str, Set[int]]] = {
+            field: defaultdict(set) for field, _ in self.FIELDS
+        }
+
+        for doc, (bean_id, name, origin, region, variety, process, flavor_notes) in enumerate(rows):
+            self.bean_ids.append(bean_id)
+            values = {
+                'name': name,
+                'origin': origin,
+                'region': region,
+                'variety': variety,
+                'process': str(process_display.get(process, process)),
+                'flavor': self.FLAVOR_SEPARATOR.join(str(flavor) for flavor in flavor_notes or []),
+            }
+            for field, _ in self.FIELDS:
+                text = (values[field] or '').lower()
+                self.texts[field].append(text)
+                postings = self.postings[field]
+                for i, char in enumerate(text):
+                    postings[char].add(doc)
+                    if i + 1 < len(text):
+                        postings[text[i:i + 2]].add(doc)
+                for token in text.replace(self.FLAVOR_SEPARATOR, ' ').split():
+                    self.tokens[field][token].add(doc)
+
+        for field, _ in self.FIELDS:
+            self.postings[field] = dict(self.postings[field])
+            self.tokens[field] = dict(self.tokens[field])
+
+        self.fuzzy = DeletionIndex(
+            [token for field, _ in self.FIELDS for token in self.tokens[field]] + list(self.aliases)
+        )
+
+    @classmethod
+    def build(cls) -> 'CoffeeSearchIndex':
+        """从数据库构建索引"""
+        from .ocr_service import OCRService
+
+        rows = list(CoffeeBean.objects.filter(is_active=True).values_list(
+            'id', 'name', 'origin__name', 'region', 'variety', 'process', 'flavor_notes'
+        ))
+        catalog_varieties = {OCRService.normalize_text(row[4] or '') for row in rows}
+        return cls(rows, OCRService.alias_terms(catalog_varieties))
+
+    def _match_field(self, field: str, keyword: str) -> Set[int]:
+        """返回字段中包含 keyword 子串的文档集合"""
+        postings = self.postings[field]
+        if len(keyword) == 1:
+            return postings.get(keyword, set())
+
+        grams = {keyword[i:i + 2] for i in range(len(keyword) - 1)}
+        candidates = sorted((postings.get(gram, set()) for gram in grams), key=len)
+        if not candidates[0]:
+            return set()
+        docs = set.intersection(*candidates)
+
+        if len(keyword) == 2:
+            return docs
+        texts = self.texts[field]
+        return {doc for doc in docs if keyword in texts[doc]}
+
+    def search(self, keywords: List[str], limit: int = 5) -> List[Dict]:
+        """
+        按关键词打分
+        返回: [{'coffee_id', 'score', 'confidence', 'matched_keywords'}]，按分数排序
+        """
+        if not keywords:
+            return []
+
+        scores: Dict[int, float] = defaultdict(int)
+        matched: Dict[int, List[str]] = defaultdict(list)
+
+        for keyword in keywords:
+            keyword_lower = keyword.lower()
+            if not keyword_lower:
+                continue
+
+            assigned: Set[int] = set()
+            for field, weight in self.FIELDS:
+                docs = self._match_field(field, keyword_lower) - assigned
+                for doc in docs:
+                    scores[doc] += weight
+                    matched[doc].append(keyword)
+                assigned |= docs
+
+            # 精确匹配不到任何咖啡时，按拼写相近的目录词或别名做模糊匹配
+            if not assigned:
+                for _, term in self.fuzzy.lookup(keyword_lower):
+                    canonical = self.aliases.get(term)
+                    for field, weight in self.FIELDS:
+                        if canonical:
+                            docs = self._match_field(field, canonical) - assigned
+                        else:
+                            docs = self.tokens[field].get(term, set()) - assigned
+                        for doc in docs:
+                            scores[doc] += weight * self.FUZZY_WEIGHT
+                            matched[doc].append(keyword)
+                        assigned |= docs
+
+        ranked = sorted(scores, key=lambda doc: (-scores[doc], doc))[:limit]
+
+        return [
+            {
+                'coffee_id': self.bean_ids[doc],
+                'score': scores[doc],
+                'confidence': min(scores[doc] / (len(keywords) * 10), 1.0),
+                'matched_keywords': list(set(matched[doc])),
+            }
+            for doc in ranked
+        ]
+
+    @cached_property
+    def bm25(self) -> BM25FMatrix:
+        """BM25F 打分矩阵，首次使用时构建"""
+        return BM25FMatrix(
+            {
+                field: [text.replace(self.FLAVOR_SEPARATOR, ' ') for text in self.texts[field]]
+                for field, _ in self.FIELDS
+            },
+            {field: weight / 10 for field, weight in self.FIELDS},
+        )
+
+    def search_bm25(self, keywords: List[str], limit: int = 5) -> List[Dict]:
+        """
+        BM25F 排序
+        一次稀疏矩阵乘法得到所有咖啡豆的分数，只保留至少有一个关键词在字段中完整出现的咖啡豆
+        （只共享个别 2-gram 的不算命中）；置信度为分数与查询自身得分之比
+        """
+        import numpy as np
+
+        keywords = [keyword for keyword in keywords if keyword]
+        if not keywords:
+            return []
+
+        scores, self_score = self.bm25.score(keywords)
+        if self_score <= 0:
+            return []
+
+        matched: Dict[int, Set[str]] = defaultdict(set)
+        for keyword in keywords:
+            keyword_lower = keyword.lower()
+            for field, _ in self.FIELDS:
+                for doc in self._match_field(field, keyword_lower):
+                    matched[doc].add(keyword)
+        if not matched:
+            return []
+
+        docs = np.fromiter(matched, dtype=np.int64)
+        docs = docs[scores[docs] > 0]
+        # 分数降序，同分按目录顺序
+        ranked = docs[np.lexsort((docs, -scores[docs]))][:limit]
+
+        return [
+            {
+                'coffee_id': self.bean_ids[doc],
+                'score': float(scores[doc]),
+                'confidence': min(float(scores[doc]) / self_score, 1.0),
+                'matched_keywords': list(matched[doc]),
+            }
+            for doc in ranked.tolist()
+        ]
+
+
+search_index = CatalogBoundCache(CoffeeSearchIndex.build)
@@ -0,0 +1,103 @@
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+
+def _is_word_char(char: str) -> bool:
+    """英文/数字字符，用于判断英文词边界"""
+    return char.isascii() and char.isalnum()
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机，一次扫描找出文本中所有词典词"""
+
+    def __init__(self, terms: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # 每个节点结束的词长度，按长度降序
+        self.output: List[List[int]] = [[]]
+
+        for term in terms:
+            if not term:
+                continue
+            node = 0
+            for char in term:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = next_node
+            if len(term) not in self.output[node]:
+                self.output[node].append(len(term))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+        for lengths in self.output:
+            lengths.sort(reverse=True)
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int]]:
+        """返回所有匹配的 (起始位置, 结束位置)"""
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length in self.output[node]:
+                yield i + 1 - length, i + 1
+
+
+class KeywordSegmenter:
+    """
+    基于咖啡目录词典的关键词切分
+    词典词按最左最长匹配切出并替换为标准写法，词典外的片段按空白切分保留
+    """
+
+    def __init__(self, canonical: Dict[str, str]):
+        """canonical: 词典词(小写) -> 输出的标准关键词"""
+        self.canonical = canonical
+        self.automaton = AhoCorasick(canonical)
+
+    def _dictionary_matches(self, text: str) -> List[Tuple[int, int]]:
+        """最左最长、互不重叠的词典匹配"""
+        matches = []
+        for start, end in self.automaton.iter_matches(text):
+            # 英文词必须落在词边界上，避免 honey 命中 honeysuckle
+            if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            matches.append((start, end))
+
+        matches.sort(key=lambda span: (span[0], span[0] - span[1]))
+        selected = []
+        covered_until = 0
+        for start, end in matches:
+            if start >= covered_until:
+                selected.append((start, end))
+                covered_until = end
+        return selected
+
+    def segment(self, text: str) -> List[Tuple[str, bool]]:
+        """
+        切分已清洗的文本
+        返回: [(片段, 是否词典词)]，按文本顺序
+        """
+        segments = []
+        position = 0
+        for start, end in self._dictionary_matches(text):
+            segments.extend((word, False) for word in text[position:start].split())
+            segments.append((self.canonical[text[start:end]], True))
+            position = end
+        segments.extend((word, False) for word in text[position:].split())
+        return segments
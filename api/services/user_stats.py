@@ -0,0 +1,191 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, QuerySet
+
+from ..models import CoffeeBean, UserRecord, UserStats
+
+# (coffee_bean_id, rating, recognized_by_ocr)，一条记录对统计的贡献只取决于这三个值
+RecordKey = Tuple[int, Optional[int], bool]
+
+
+def _bump(counts: Dict[str, int], key, delta: int) -> None:
+    key = str(key)
+    value = counts.get(key, 0) + delta
+    if value > 0:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+def aggregate_flavors(records: QuerySet) -> Counter:
+    """
+    统计一组用户记录对应咖啡豆的风味标签，每条记录计一次
+    按咖啡豆分组后在数据库内展开 flavor_notes（PostgreSQL jsonb_array_elements_text、
+    SQLite json_each），一次查询得到结果；其他数据库取回每个咖啡豆的风味一次后在内存中计数
+    """
+    per_bean = records.values('coffee_bean_id').annotate(records=Count('id')).order_by()
+    bean_table = CoffeeBean._meta.db_table
+
+    if connection.vendor in ('postgresql', 'sqlite'):
+        sql, params = per_bean.query.sql_with_params()
+        if connection.vendor == 'postgresql':
+            unnest = 'CROSS JOIN LATERAL jsonb_array_elements_text(b.flavor_notes) AS f(flavor)'
+        else:
+            unnest = 'CROSS JOIN json_each(b.flavor_notes) AS f'
+        flavor = 'f.flavor' if connection.vendor == 'postgresql' else 'f.value'
+        try:
+            # 保存点：查询出错时不影响外层事务，退回到内存计数
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT {flavor}, SUM(r.records) FROM ({sql}) r '
+                    f'JOIN {bean_table} b ON b.id = r.coffee_bean_id {unnest} '
+                    f'GROUP BY {flavor}',
+                    params,
+                )
+                return Counter({str(name): int(count) for name, count in cursor.fetchall()})
+        except DatabaseError as e:
+            # 如 SQLite 未编译 JSON1 扩展
+            print(f"Flavor Aggregation Error: {e}")
+
+    weights = dict(per_bean.values_list('coffee_bean_id', 'records'))
+    counter = Counter()
+    for bean_id, flavor_notes in CoffeeBean.objects.filter(id__in=weights).values_list('id', 'flavor_notes'):
+        for flavor in flavor_notes or []:
+            counter[flavor] += weights[bean_id]
+    return counter
+
+
+class UserStatsService:
+    """用户统计快照的增量维护与重建"""
+
+    # 计入口味偏好的最低评分
+    FLAVOR_MIN_RATING = 4
+
+    @classmethod
+    def is_rated(cls, rating: Optional[int]) -> bool:
+        return rating is not None and rating >= cls.FLAVOR_MIN_RATING
+
+    # 快照中随记录增量维护的字段
+    COUNTER_FIELDS = [
+        'total_records', 'coffee_counts', 'origin_counts', 'variety_counts', 'process_counts',
+        'flavor_counts', 'tasted_flavor_counts', 'altitude_counts', 'rating_counts', 'ocr_records',
+    ]
+
+    @classmethod
+    def bean_dimensions(cls, bean_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """一次查询取出咖啡豆的统计维度"""
+        rows = CoffeeBean.objects.filter(id__in=set(bean_ids)).values_list(
+            'id', 'origin__name', 'variety', 'process', 'flavor_notes', 'altitude_min'
+        )
+        return {
+            bean_id: {
+                'origin': origin,
+                'variety': variety,
+                'process': process,
+                'flavor_notes': flavor_notes or [],
+                'altitude_min': altitude_min,
+            }
+            for bean_id, origin, variety, process, flavor_notes, altitude_min in rows
+        }
+
+    @classmethod
+    def add_records(cls, stats: UserStats, bean_id: int, bean: Dict[str, Any],
+                    rating: Optional[int], ocr: bool, records: int) -> None:
+        """把某咖啡豆 records 条评分和识别方式相同的记录计入快照，传负数为扣除"""
+        stats.total_records += records
+        _bump(stats.coffee_counts, bean_id, records)
+        _bump(stats.origin_counts, bean['origin'], records)
+        _bump(stats.variety_counts, bean['variety'], records)
+        _bump(stats.process_counts, bean['process'], records)
+        if bean['altitude_min'] is not None:
+            _bump(stats.altitude_counts, bean['altitude_min'], records)
+        if rating is not None:
+            _bump(stats.rating_counts, rating, records)
+        if ocr:
+            stats.ocr_records += records
+        for flavor in bean['flavor_notes']:
+            _bump(stats.tasted_flavor_counts, flavor, records)
+            if cls.is_rated(rating):
+                _bump(stats.flavor_counts, flavor, records)
+
+    @classmethod
+    def rebuild(cls, user_id: int) -> UserStats:
+        """
+        从用户记录完整重算快照
+        先建立并锁定快照行再读取记录，并发的首次写入或增量更新会等待本次重算提交，不会丢失记录
+        """
+        with transaction.atomic():
+            UserStats.objects.get_or_create(user_id=user_id)
+            stats = UserStats.objects.select_for_update().get(user_id=user_id)
+
+            rows = list(
+                UserRecord.objects.filter(user_id=user_id)
+                .values_list('coffee_bean_id', 'rating', 'recognized_by_ocr')
+                .annotate(records=Count('id')).order_by()
+            )
+            beans = cls.bean_dimensions(row[0] for row in rows)
+
+            fresh = UserStats(user_id=user_id)
+            for bean_id, rating, ocr, records in rows:
+                cls.add_records(fresh, bean_id, beans[bean_id], rating, ocr, records)
+            for field in cls.COUNTER_FIELDS:
+                setattr(stats, field, getattr(fresh, field))
+            stats.save()
+        return stats
+
+    @classmethod
+    def apply(cls, user_id: int, old: Optional[RecordKey], new: Optional[RecordKey]) -> Optional[UserStats]:
+        """
+        一条记录从 old 变为 new（新建时 old 为 None，删除时 new 为 None）
+        在事务内锁定快照行后增量更新，返回更新后的快照；无变化或未建立快照时返回 None
+        """
+        if old == new:
+            return None
+
+        with transaction.atomic():
+            stats = UserStats.objects.select_for_update().filter(user_id=user_id).first()
+            if stats is None:
+                # 删除时（包括删除用户的级联删除）不新建快照，读取时再惰性重建
+                return cls.rebuild(user_id) if new is not None else None
+
+            beans = cls.bean_dimensions(key[0] for key in (old, new) if key is not None)
+            if any(key is not None and key[0] not in beans for key in (old, new)):
+                # 咖啡豆已被删除，无法确定其原先的维度
+                return cls.rebuild(user_id)
+
+            if old is not None:
+                cls.add_records(stats, old[0], beans[old[0]], old[1], old[2], -1)
+            if new is not None:
+                cls.add_records(stats, new[0], beans[new[0]], new[1], new[2], 1)
+            stats.save()
+            return stats
+
+    @classmethod
+    def get(cls, user_id: int) -> UserStats:
+        """主键读取快照，不存在时重建"""
+        return UserStats.objects.filter(user_id=user_id).first() or cls.rebuild(user_id)
+
+    @classmethod
+    def to_dict(cls, stats: UserStats) -> Dict[str, Any]:
+        """转换为 get_user_stats 的返回格式（不含成就数）"""
+        origin_counts = stats.origin_counts
+        favorite_origin = max(origin_counts, key=origin_counts.get) if origin_counts else None
+        process_breakdown = sorted(stats.process_counts.items(), key=lambda item: -item[1])
+
+        return {
+            'total_records': stats.total_records,
+            'unique_coffees': len(stats.coffee_counts),
+            'unique_origins': len(origin_counts),
+            'unique_varieties': len(stats.variety_counts),
+            'favorite_origin': favorite_origin,
+            'top_flavors': [
+                {'flavor': flavor, 'count': count}
+                for flavor, count in Counter(stats.flavor_counts).most_common(5)
+            ],
+            'process_breakdown': [
+                {'coffee_bean__process': process, 'count': count}
+                for process, count in process_breakdown
+            ],
+        }
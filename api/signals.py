@@ -0,0 +1,171 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Achievement, CoffeeBean, Origin, User, UserAchievement, UserAchievementProgress, UserRecord, UserStats
+from .services.achievement_progress import AchievementProgressService
+from .services.achievement_rules import changed_dimensions
+from .services.achievement_stats import AchievementStatsService
+from .services.catalog import invalidate_catalog
+from .services.fulltext import FullTextSearch, build_document
+from .services.user_stats import UserStatsService
+
+
+@receiver(post_save, sender=CoffeeBean)
+@receiver(post_delete, sender=CoffeeBean)
+@receiver(post_save, sender=Origin)
+@receiver(post_delete, sender=Origin)
+def catalog_changed(sender, **kwargs):
+    """咖啡目录变化时让进程内的搜索缓存失效"""
+    invalidate_catalog()
+
+
+@receiver(pre_save, sender=CoffeeBean)
+def update_search_document(sender, instance, **kwargs):
+    """保存咖啡豆前生成全文检索文本"""
+    instance.search_document = build_document(
+        instance.name, instance.origin.name, instance.region, instance.variety, instance.flavor_notes
+    )
+
+
+@receiver(post_save, sender=CoffeeBean)
+def sync_search_index(sender, instance, **kwargs):
+    """同步全文检索影子表"""
+    FullTextSearch.sync([instance])
+
+
+@receiver(post_delete, sender=CoffeeBean)
+def remove_from_search_index(sender, instance, **kwargs):
+    FullTextSearch.remove(instance.pk)
+
+
+@receiver(post_save, sender=Origin)
+def update_origin_search_documents(sender, instance, created, **kwargs):
+    """产地改名后更新其下咖啡豆的检索文本"""
+    previous = getattr(instance, '_pre_save_name', None)
+    if created or previous is None or previous == instance.name:
+        return
+    beans = list(instance.coffee_beans.all())
+    for bean in beans:
+        bean.origin = instance
+        bean.search_document = build_document(
+            bean.name, instance.name, bean.region, bean.variety, bean.flavor_notes
+        )
+    CoffeeBean.objects.bulk_update(beans, ['search_document'])
+    FullTextSearch.sync(beans)
+
+
+# 计入用户统计的咖啡豆字段
+BEAN_STATS_FIELDS = ('origin_id', 'variety', 'process', 'flavor_notes', 'altitude_min')
+
+
+def rebuild_user_stats(snapshots):
+    """重算这些用户的统计快照和成就进度"""
+    for user_id in snapshots.values_list('user_id', flat=True):
+        AchievementProgressService.update(user_id, UserStatsService.rebuild(user_id))
+
+
+@receiver(pre_save, sender=CoffeeBean)
+def remember_bean_stats_fields(sender, instance, **kwargs):
+    instance._pre_save_stats_fields = None
+    if instance.pk:
+        instance._pre_save_stats_fields = CoffeeBean.objects.filter(pk=instance.pk).values_list(
+            *BEAN_STATS_FIELDS
+        ).first()
+
+
+@receiver(post_save, sender=CoffeeBean)
+def rebuild_stats_for_bean(sender, instance, created, **kwargs):
+    """
+    咖啡豆的产地、品种等修改后，用户统计中按旧值计入的部分无法再按新值扣除，
+    重算记录过该咖啡豆的用户
+    """
+    previous = getattr(instance, '_pre_save_stats_fields', None)
+    if created or previous is None:
+        return
+    if previous != tuple(getattr(instance, field) for field in BEAN_STATS_FIELDS):
+        rebuild_user_stats(UserStats.objects.filter(coffee_counts__has_key=str(instance.pk)))
+
+
+@receiver(pre_save, sender=Origin)
+def remember_origin_name(sender, instance, **kwargs):
+    instance._pre_save_name = None
+    if instance.pk:
+        instance._pre_save_name = Origin.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Origin)
+def rebuild_stats_for_origin(sender, instance, created, **kwargs):
+    """产地改名后重算按旧名计入的用户统计"""
+    previous = getattr(instance, '_pre_save_name', None)
+    if not created and previous is not None and previous != instance.name:
+        rebuild_user_stats(UserStats.objects.filter(origin_counts__has_key=previous))
+
+
+@receiver(pre_save, sender=UserRecord)
+def remember_pre_save_state(sender, instance, **kwargs):
+    """记下修改前的咖啡豆、评分和识别方式，用于增量更新用户统计和成就检查"""
+    instance._pre_save_state = None
+    if instance.pk:
+        instance._pre_save_state = UserRecord.objects.filter(pk=instance.pk).values_list(
+            'coffee_bean_id', 'rating', 'recognized_by_ocr'
+        ).first()
+
+
+@receiver(post_save, sender=UserRecord)
+def update_user_stats(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_pre_save_state', None)
+    current = (instance.coffee_bean_id, instance.rating, instance.recognized_by_ocr)
+    stats = UserStatsService.apply(instance.user_id, previous, current)
+    if stats is not None:
+        AchievementProgressService.update(instance.user_id, stats, changed_dimensions(previous, current))
+
+
+@receiver(post_delete, sender=UserRecord)
+def remove_from_user_stats(sender, instance, **kwargs):
+    previous = (instance.coffee_bean_id, instance.rating, instance.recognized_by_ocr)
+    stats = UserStatsService.apply(instance.user_id, previous, None)
+    if stats is not None:
+        AchievementProgressService.update(
+            instance.user_id, stats, changed_dimensions(previous, None), create=False
+        )
+
+
+@receiver(pre_save, sender=Achievement)
+def remember_achievement_condition(sender, instance, **kwargs):
+    instance._pre_save_condition = None
+    if instance.pk:
+        instance._pre_save_condition = Achievement.objects.filter(pk=instance.pk).values_list(
+            'condition', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Achievement)
+def reset_achievement_progress(sender, instance, created, **kwargs):
+    """成就条件修改后清空其进度，读取进度时再按新条件补齐"""
+    previous = getattr(instance, '_pre_save_condition', None)
+    if not created and previous != instance.condition:
+        UserAchievementProgress.objects.filter(achievement=instance).delete()
+
+
+@receiver(post_save, sender=Achievement)
+def create_achievement_stats(sender, instance, created, **kwargs):
+    if created:
+        AchievementStatsService.create_for(instance)
+
+
+@receiver(post_save, sender=User)
+def count_new_user(sender, instance, created, **kwargs):
+    """成就解锁比例的分母随用户注册增加"""
+    if created:
+        AchievementStatsService.add_users(1)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_deleted_user(sender, instance, **kwargs):
+    """注销用户时减少用户总数，其解锁记录的级联删除由 uncount_unlock 扣除"""
+    AchievementStatsService.add_users(-1)
+
+
+@receiver(post_delete, sender=UserAchievement)
+def uncount_unlock(sender, instance, **kwargs):
+    AchievementStatsService.add_unlocks([instance.achievement_id], sign=-1)
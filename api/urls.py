@@ -48,10 +48,14 @@ urlpatterns = [
     # 咖啡豆
     path('coffee/', views.CoffeeBeanListView.as_view(), name='coffee-list'),
     path('coffee/<int:pk>/', views.CoffeeBeanDetailView.as_view(), name='coffee-detail'),
+    path('coffee/suggest/', views.CoffeeSuggestView.as_view(), name='coffee-suggest'),
     
     # 识别
     path('recognize/ocr/', views.OCRRecognizeView.as_view(), name='ocr-recognize'),
+    path('recognize/ocr/batch/', views.OCRBatchRecognizeView.as_view(), name='ocr-recognize-batch'),
     path('recognize/search/', views.SearchCoffeeView.as_view(), name='search-coffee'),
+    path('recognize/jobs/', views.OCRJobCreateView.as_view(), name='ocr-job-create'),
+    path('recognize/jobs/<uuid:pk>/', views.OCRJobDetailView.as_view(), name='ocr-job-detail'),
     
     # 用户记录
     path('records/', views.UserRecordListCreateView.as_view(), name='record-list-create'),
@@ -61,6 +65,8 @@ urlpatterns = [
     # 成就
     path('achievements/', views.AchievementListView.as_view(), name='achievement-list'),
     path('achievements/my/', views.UserAchievementListView.as_view(), name='user-achievement-list'),
+    path('achievements/progress/', views.AchievementProgressView.as_view(), name='achievement-progress'),
+    path('achievements/notifications/', views.AchievementNotificationView.as_view(), name='achievement-notifications'),
     
     # 咖啡豆库存
     path('inventory/', views.UserCoffeeInventoryListCreateView.as_view(), name='inventory-list-create'),
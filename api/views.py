@@ -2,25 +2,34 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from django.utils import timezone
 import csv
 import json
 from datetime import datetime
 
-from .models import Origin, CoffeeBean, UserRecord, Achievement, UserAchievement, UserCoffeeInventory
+from .models import Origin, CoffeeBean, UserRecord, Achievement, UserAchievement, UserCoffeeInventory, OCRJob
 from .serializers import (
     UserSerializer, UserRegisterSerializer,
     OriginSerializer, CoffeeBeanListSerializer, CoffeeBeanDetailSerializer,
     UserRecordSerializer, UserRecordCreateSerializer,
-    AchievementSerializer, UserAchievementSerializer,
-    OCRRequestSerializer, SearchQuerySerializer,
+    AchievementSerializer, AchievementProgressSerializer, UserAchievementSerializer,
+    OCRRequestSerializer, OCRBatchRequestSerializer, SearchQuerySerializer,
     YearlySummarySerializer,
     UserCoffeeInventorySerializer, UserCoffeeInventoryCreateSerializer
 )
 from .services.ocr_service import OCRService
+from .services.ocr_jobs import OCRJobService
+from .services.image_ingest import ImageIngestService
+from .services.fulltext import FullTextSearch
+from .services.autocomplete import autocomplete_index
 from .services.achievement_service import AchievementService
+from .services.achievement_progress import AchievementProgressService
+from .services.achievement_jobs import AchievementJobService
+from .services.achievement_rules import RecordDelta, get_rule
 
 User = get_user_model()
 
@@ -66,15 +75,18 @@ class OriginListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     
     def get_queryset(self):
-        return Origin.objects.filter(is_active=True)
+        # 分组查询不会带上 Meta.ordering，分页需要显式排序
+        return Origin.objects.filter(is_active=True).with_stats(self.request.user).order_by('name')
 
 
 class OriginDetailView(generics.RetrieveAPIView):
     """产地详情"""
-    queryset = Origin.objects.filter(is_active=True)
     serializer_class = OriginSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     lookup_field = 'pk'
+    
+    def get_queryset(self):
+        return Origin.objects.filter(is_active=True).with_stats(self.request.user)
 
 
 # ==================== 咖啡豆视图 ====================
@@ -87,16 +99,20 @@ class CoffeeBeanListView(generics.ListAPIView):
     def get_queryset(self):
         queryset = CoffeeBean.objects.filter(is_active=True).select_related('origin')
         
-        # 搜索功能
+        # 搜索功能：优先走数据库全文索引并按相关度排序，不可用时退回 icontains
         search = self.request.query_params.get('search', '')
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(origin__name__icontains=search) |
-                Q(region__icontains=search) |
-                Q(variety__icontains=search) |
-                Q(flavor_notes__icontains=search)
-            )
+            matched = FullTextSearch.filter(queryset, search)
+            if matched is not None:
+                queryset = matched
+            else:
+                queryset = queryset.filter(
+                    Q(name__icontains=search) |
+                    Q(origin__name__icontains=search) |
+                    Q(region__icontains=search) |
+                    Q(variety__icontains=search) |
+                    Q(flavor_notes__icontains=search)
+                )
         
         # 筛选功能
         origin = self.request.query_params.get('origin', '')
@@ -123,6 +139,17 @@ class CoffeeBeanDetailView(generics.RetrieveAPIView):
 
 # ==================== 用户记录视图 ====================
 
+def unlocked_achievement_data(achievement):
+    """新解锁成就的通知内容"""
+    return {
+        'id': achievement.id,
+        'name': achievement.name,
+        'description': achievement.description,
+        'icon': achievement.icon,
+        'rarity': achievement.rarity,
+    }
+
+
 class UserRecordListCreateView(generics.ListCreateAPIView):
     """用户记录列表/创建"""
     permission_classes = [permissions.IsAuthenticated]
@@ -140,14 +167,24 @@ class UserRecordListCreateView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         record = serializer.save()
         
-        # 检查成就解锁
+        # 只检查本次写入可能影响的成就
+        delta = RecordDelta(record, getattr(record, '_pre_save_state', None))
         service = AchievementService(self.request.user)
-        newly_unlocked = service.check_achievements()
-        
-        # 将新解锁的成就添加到响应中
-        self.newly_unlocked = newly_unlocked
+        if self.achievement_evaluation == 'sync':
+            self.newly_unlocked = service.check_achievements(delta, notified=True)
+        else:
+            # 提交后在后台检查，本次响应带回之前后台解锁、尚未通知的成就
+            AchievementJobService.submit(self.request.user.id, delta)
+            self.newly_unlocked = service.take_notifications()
     
     def create(self, request, *args, **kwargs):
+        self.achievement_evaluation = (
+            request.query_params.get('achievements')
+            or getattr(settings, 'ACHIEVEMENT_EVALUATION', 'deferred')
+        )
+        if self.achievement_evaluation not in ('sync', 'deferred'):
+            return Response({'error': 'achievements 只支持 sync 或 deferred'}, status=status.HTTP_400_BAD_REQUEST)
+        
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
@@ -157,15 +194,9 @@ class UserRecordListCreateView(generics.ListCreateAPIView):
         response_data = {
             'record': serializer.data,
             'new_achievements': [
-                {
-                    'id': a.id,
-                    'name': a.name,
-                    'description': a.description,
-                    'icon': a.icon,
-                    'rarity': a.rarity
-                }
-                for a in getattr(self, 'newly_unlocked', [])
-            ]
+                unlocked_achievement_data(a) for a in getattr(self, 'newly_unlocked', [])
+            ],
+            'achievements_pending': self.achievement_evaluation == 'deferred',
         }
         
         return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
@@ -192,26 +223,124 @@ class OCRRecognizeView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         image = serializer.validated_data['image']
-        image_data = image.read()
+        image_hash, image_data = ImageIngestService.ingest(image)
         
         # 调用 OCR 服务
-        result = OCRService.recognize_and_search(image_data)
+        result = OCRService.recognize_and_search(image_data, image_hash=image_hash)
         
-        # 序列化结果
-        from .serializers import RecognitionResultSerializer
-        results_data = []
-        for item in result['results']:
-            results_data.append({
-                'coffee': item['coffee'],
-                'confidence': item['confidence'],
-                'matched_keywords': item['matched_keywords']
-            })
+        return Response(recognition_response_data(result, {'request': request}))
+
+
+def recognition_response_data(result, context=None):
+    """OCR 识别结果的响应数据"""
+    from .serializers import RecognitionResultSerializer
+    results_data = []
+    for item in result['results']:
+        results_data.append({
+            'coffee': item['coffee'],
+            'confidence': item['confidence'],
+            'matched_keywords': item['matched_keywords']
+        })
+    
+    return {
+        'recognized_text': result['text'],
+        'keywords': result['keywords'],
+        'results': RecognitionResultSerializer(results_data, many=True, context=context or {}).data,
+        'ocr_confidence': result['ocr_confidence'],
+        'from_cache': result['from_cache']
+    }
+
+
+class OCRBatchRecognizeView(APIView):
+    """批量 OCR 识别：一次上传多张图片，按上传顺序返回每张图片的结果"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = OCRBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        images = [
+            ImageIngestService.ingest(image)
+            for image in serializer.validated_data['images']
+        ]
+        results = OCRService.recognize_and_search_batch(images)
         
+        # 所有结果共用一个 context，已发现的咖啡豆只查询一次
+        context = {'request': request}
         return Response({
-            'recognized_text': result['text'],
-            'keywords': result['keywords'],
-            'results': RecognitionResultSerializer(results_data, many=True).data,
-            'from_cache': result['from_cache']
+            'results': [recognition_response_data(result, context) for result in results]
+        })
+
+
+class OCRJobCreateView(APIView):
+    """异步 OCR 识别：上传后立即返回任务 id"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = OCRRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        image = serializer.validated_data['image']
+        image_hash, image_data = ImageIngestService.ingest(image)
+        job = OCRJobService.submit(request.user, image_data, image_hash=image_hash)
+        
+        return Response({
+            'job_id': str(job.id),
+            'status': job.status,
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class OCRJobDetailView(APIView):
+    """
+    异步 OCR 任务状态
+    ?wait=秒数 时长轮询，任务完成或超时后返回
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, pk):
+        job = get_object_or_404(OCRJob, pk=pk, user=request.user)
+        
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            return Response({'error': 'wait 参数必须是数字'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        wait = min(max(wait, 0), getattr(settings, 'OCR_JOB_MAX_WAIT', 25))
+        if wait and not job.is_finished:
+            job = OCRJobService.wait(job, wait)
+        job = OCRJobService.expire_if_stale(job)
+        
+        data = {
+            'job_id': str(job.id),
+            'status': job.status,
+            'error': job.error,
+            'created_at': job.created_at,
+            'finished_at': job.finished_at,
+        }
+        if job.status == 'succeeded':
+            result = dict(job.result, results=OCRService.load_results(job.result['results']))
+            data['result'] = recognition_response_data(result, {'request': request})
+        
+        return Response(data)
+
+
+class CoffeeSuggestView(APIView):
+    """搜索框输入联想"""
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        max_results = getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 10)
+        try:
+            limit = min(max(int(request.query_params.get('limit', max_results)), 1), max_results)
+        except ValueError:
+            limit = max_results
+        
+        return Response({
+            'query': query,
+            'suggestions': autocomplete_index.suggest(query, limit=limit)
         })
 
 
@@ -224,9 +353,13 @@ class SearchCoffeeView(APIView):
         if not query:
             return Response({'error': '请提供搜索关键词'}, status=status.HTTP_400_BAD_REQUEST)
         
+        ranking = request.query_params.get('ranking') or getattr(settings, 'SEARCH_RANKING', 'weighted')
+        if ranking not in ('bm25', 'weighted'):
+            return Response({'error': 'ranking 只支持 bm25 或 weighted'}, status=status.HTTP_400_BAD_REQUEST)
+        
         # 使用 OCR 服务的搜索功能
         keywords = OCRService.clean_text(query)
-        results = OCRService.search_coffee_beans(keywords)
+        results = OCRService.search_coffee_beans(keywords, ranking=ranking)
         
         from .serializers import RecognitionResultSerializer
         results_data = []
@@ -240,7 +373,7 @@ class SearchCoffeeView(APIView):
         return Response({
             'query': query,
             'keywords': keywords,
-            'results': RecognitionResultSerializer(results_data, many=True).data
+            'results': RecognitionResultSerializer(results_data, many=True, context={'request': request}).data
         })
 
 
@@ -252,7 +385,7 @@ class AchievementListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Achievement.objects.filter(is_active=True)
+        return Achievement.objects.filter(is_active=True).select_related('stats')
 
 
 class UserAchievementListView(generics.ListAPIView):
@@ -263,7 +396,34 @@ class UserAchievementListView(generics.ListAPIView):
     def get_queryset(self):
         return UserAchievement.objects.filter(
             user=self.request.user
-        ).select_related('achievement').order_by('-unlocked_at')
+        ).select_related('achievement__stats').order_by('-unlocked_at')
+
+
+class AchievementNotificationView(APIView):
+    """后台检查新解锁、尚未通知的成就，读取后标记为已通知"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        achievements = AchievementService(request.user).take_notifications()
+        return Response({
+            'new_achievements': [unlocked_achievement_data(a) for a in achievements]
+        })
+
+
+class AchievementProgressView(APIView):
+    """全部成就的进度，一次查询读取增量维护的进度表"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        queryset = Achievement.objects.filter(is_active=True).with_progress(request.user)
+        achievements = list(queryset)
+        
+        # 新增成就或条件修改后尚无进度行，按用户统计补齐后重新读取
+        if any(a.progress_target is None and get_rule(a.condition) for a in achievements):
+            AchievementProgressService.sync(request.user.id)
+            achievements = list(queryset.all())
+        
+        return Response(AchievementProgressSerializer(achievements, many=True).data)
 
 
 # ==================== 统计视图 ====================
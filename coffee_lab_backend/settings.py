@@ -186,6 +186,53 @@ AUTH_USER_MODEL = 'api.User'
 # Google Cloud Vision settings
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', '')
 
+# OCR backend settings
+# google: Google Cloud Vision; fake: 本地模拟 OCR（离线压测用）
+OCR_BACKEND = os.getenv('OCR_BACKEND', 'google')
+# 单次 OCR 调用超时(秒)，0 表示不限制
+OCR_TIMEOUT = float(os.getenv('OCR_TIMEOUT', '10'))
+# 模拟 OCR 的延迟(毫秒)，以及 {原始上传图片MD5: 文本} 形式的 JSON 固定结果文件
+OCR_FAKE_LATENCY_MS = int(os.getenv('OCR_FAKE_LATENCY_MS', '0'))
+OCR_FAKE_FIXTURE = os.getenv('OCR_FAKE_FIXTURE', '')
+
+# 送 OCR 前的图片像素上限，超出时缩小并以 JPEG 重新编码；0 表示不处理
+OCR_MAX_PIXELS = int(os.getenv('OCR_MAX_PIXELS', '4000000'))
+OCR_JPEG_QUALITY = int(os.getenv('OCR_JPEG_QUALITY', '85'))
+# 每个进程同时解码的图片数上限
+OCR_MAX_CONCURRENT_DECODES = int(os.getenv('OCR_MAX_CONCURRENT_DECODES', '2'))
+
+# 批量 OCR 接口单次最多上传的图片数
+OCR_BATCH_MAX_IMAGES = int(os.getenv('OCR_BATCH_MAX_IMAGES', '10'))
+
+# 异步 OCR 任务的线程池大小，以及长轮询的最长等待时间(秒)
+OCR_WORKER_THREADS = int(os.getenv('OCR_WORKER_THREADS', '4'))
+OCR_JOB_MAX_WAIT = int(os.getenv('OCR_JOB_MAX_WAIT', '25'))
+# 创建超过该秒数仍未完成的任务在查询时标记为失败，设为 0 关闭
+OCR_JOB_TIMEOUT = int(os.getenv('OCR_JOB_TIMEOUT', '300'))
+
+# OCR cache settings
+# 感知哈希汉明距离不超过该值的图片视为同一张，直接命中 OCR 缓存；设为 -1 关闭
+OCR_PHASH_MAX_DISTANCE = int(os.getenv('OCR_PHASH_MAX_DISTANCE', '6'))
+# 无匹配结果的缓存有效期(秒)
+OCR_NEGATIVE_CACHE_TTL = int(os.getenv('OCR_NEGATIVE_CACHE_TTL', '3600'))
+
+# Catalog cache settings
+# 进程内搜索索引等缓存重新校验咖啡目录版本的间隔(秒)
+CATALOG_REVALIDATE_SECONDS = int(os.getenv('CATALOG_REVALIDATE_SECONDS', '5'))
+
+# Search settings
+# 搜索接口默认排序方式: weighted 或 bm25 (需要 numpy / scipy，可用 ?ranking=bm25 试用)
+SEARCH_RANKING = os.getenv('SEARCH_RANKING', 'weighted')
+# 输入联想最多返回的条数
+AUTOCOMPLETE_MAX_RESULTS = int(os.getenv('AUTOCOMPLETE_MAX_RESULTS', '10'))
+# 输入联想热度的刷新间隔(秒)
+AUTOCOMPLETE_POPULARITY_TTL = int(os.getenv('AUTOCOMPLETE_POPULARITY_TTL', '300'))
+
+# Achievement settings
+# 新建记录后的成就检查方式: deferred (提交后由线程池执行) 或 sync (在请求内执行并直接返回)
+ACHIEVEMENT_EVALUATION = os.getenv('ACHIEVEMENT_EVALUATION', 'deferred')
+ACHIEVEMENT_WORKER_THREADS = int(os.getenv('ACHIEVEMENT_WORKER_THREADS', '2'))
+
 # AWS S3 settings (optional)
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID', '')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY', '')
@@ -28,10 +28,13 @@ echo "🎨 Collecting static files..."
 python manage.py collectstatic --noinput || echo "⚠️ Static files warning"
 
 # 启动 Gunicorn
+# gthread：每个 worker 多个线程，OCR 任务长轮询（?wait=）只占用一个线程，不会阻塞整个 worker
 echo "🌐 Starting Gunicorn on port $PORT..."
 exec gunicorn coffee_lab_backend.wsgi:application \
     --bind 0.0.0.0:$PORT \
     --workers 2 \
+    --worker-class gthread \
+    --threads ${GUNICORN_THREADS:-8} \
     --timeout 60 \
     --access-logfile - \
     --error-logfile -